@@ -1,20 +1,25 @@
 import asyncio
 import logging
+from typing import Any
 
-import coloredlogs
 from async_timeout import timeout
-from fastapi import (APIRouter, Depends, HTTPException, Request, Response,
-                     status)
+from fastapi import (APIRouter, BackgroundTasks, Depends, HTTPException,
+                     Request, Response, status)
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import select
 
-from api_logic.errors import (internal_server_error, url_gone_error,
-                              url_not_found_error)
-from api_logic.logic import get_client_address
+from api_logic.errors import (internal_server_error, service_unavailable_error,
+                              url_gone_error, url_not_found_error)
+from api_logic.logic import get_client_info
 from db.db import get_session
 from models.entity import Click as ClickModel
 from models.entity import Url as UrlModel
-from services.entity import click_crud, url_crud
+from services.analytics import analytics
+from services.breaker import DatabaseUnavailable, db_breaker
+from services.cache import CachedUrl, redirect_cache
+from services.clicks import record_click
+from services.entity import url_crud
+from services.spool import click_spool
 
 from .entity import router
 
@@ -23,7 +28,6 @@ api_router.include_router(router, prefix='/urls', tags=['General Methods'])
 local_router = APIRouter()
 
 logger = logging.getLogger(__name__)
-coloredlogs.install(level='DEBUG')
 
 
 @local_router.get(
@@ -51,6 +55,32 @@ async def ping_database(
     return {'detail': 'Database is available'}
 
 
+@local_router.get(
+    '/metrics',
+    status_code=status.HTTP_200_OK
+)
+async def get_metrics() -> dict[str, Any]:
+    """
+    Get the state of the worker: database circuit breaker,
+    degraded mode, spooled clicks, cache size and analytics sketches.
+    """
+
+    return {
+        'degraded': db_breaker.degraded,
+        'database': db_breaker.metrics(),
+        'clicks': {
+            'spooled': click_spool.spooled,
+            'replayed': click_spool.replayed,
+            'dropped': click_spool.dropped,
+        },
+        'cache': {'size': len(redirect_cache)},
+        'analytics': {
+            'sketches': len(analytics),
+            'dropped': analytics.dropped,
+        },
+    }
+
+
 @local_router.get(
     '/{short_url}',
     status_code=status.HTTP_307_TEMPORARY_REDIRECT
@@ -59,6 +89,7 @@ async def url_following(
     short_url: str,
     response: Response,
     request: Request,
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_session),
 ):
     """
@@ -68,19 +99,42 @@ async def url_following(
     Make a request in a new browser page.
     """
 
+    if cached := redirect_cache.get(short_url):
+        client = get_client_info(request=request)
+
+        # clicks counter is updated after the response was sent
+        background_tasks.add_task(
+            record_click, url_id=cached.id, client=client, increment=True)
+
+        response.headers['Location'] = cached.full_url
+
+        logger.debug(
+            'Client "%(client)s" was redirected from cache',
+            {'client': client.ip}
+        )
+
+        return
+
     try:
-        url_obj = await url_crud.update(
+        url_obj = await db_breaker.call('redirect', lambda: url_crud.update(
             short_url=short_url,
             field='clicks',
             db=db
-        )
+        ))
     except ValueError:
         logger.critical('Function got wrong args')
         internal_server_error()
+    except DatabaseUnavailable:
+        logger.error(
+            'Short URL "%(short_url)s" is not cached, database is degraded',
+            {'short_url': short_url}
+        )
+        service_unavailable_error()
 
     if not url_obj:
         logger.error(
-            'Short URL "%(short_url)s" was not found in database',
+            'Short URL "%(short_url)s" was not found in database '
+            'or has expired',
             {'short_url': short_url}
         )
         url_not_found_error()
@@ -98,23 +152,22 @@ async def url_following(
             {'short_url': short_url}
         )
 
-        client = get_client_address(
-            request=request
-        )
+        redirect_cache.set(short_url, CachedUrl(
+            id=url_obj.id,
+            full_url=url_obj.full_url,
+            expires_at=url_obj.expires_at
+        ))
 
-        await click_crud.create(
-            url_id=url_obj.id, client=client, db=db)
+        client = get_client_info(request=request)
 
-        logger.debug(
-            'Click object with short URL "%(short_url)s" was created',
-            {'short_url': short_url}
-        )
+        background_tasks.add_task(
+            record_click, url_id=url_obj.id, client=client)
 
         response.headers['Location'] = url_obj.full_url
 
         logger.debug(
             'Client "%(client)s" was redirected',
-            {'client': client}
+            {'client': client.ip}
         )
 
         return
@@ -1,23 +1,26 @@
 import logging
 from typing import Any
 
-import coloredlogs
-from fastapi import (APIRouter, Depends, HTTPException, Request, Response,
-                     status)
-from sqlalchemy.exc import IntegrityError
+from fastapi import (APIRouter, BackgroundTasks, Depends, Header, Request,
+                     Response, status)
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from api_logic.errors import (internal_server_error, url_gone_error,
-                              url_not_found_error)
-from api_logic.logic import get_client_address, shortener
+from api_logic.errors import (idempotency_key_error, internal_server_error,
+                              service_unavailable_error, url_expired_error,
+                              url_gone_error, url_not_found_error)
+from api_logic.logic import get_client_info, is_expired
 from db.db import get_session
-from schemas.entity import Url, UrlBase
+from schemas.entity import TopUrl, Url, UrlCreate, UrlError, UrlStatus
+from services.analytics import analytics
+from services.breaker import DatabaseUnavailable, db_breaker
+from services.cache import redirect_cache
+from services.clicks import record_click
+from services.coalescing import SavedResponse, create_flight, idempotency_store
 from services.entity import click_crud, url_crud
 
 router = APIRouter()
 
 logger = logging.getLogger(__name__)
-coloredlogs.install(level='DEBUG')
 
 
 @router.post(
@@ -28,15 +31,48 @@ coloredlogs.install(level='DEBUG')
 async def create_short_url(
     *,
     db: AsyncSession = Depends(get_session),
-    url_in: UrlBase,
-    response: Response
+    url_in: UrlCreate,
+    response: Response,
+    idempotency_key: str | None = Header(None)
 ) -> Any:
     """
-    Create short version of URL.
+    Create short version of URL. \n
+    Concurrent requests with the same URL and expiration date
+    share one database call.
+    A retry with the same `Idempotency-Key` gets the original response.
     """
 
-    if check_url := await url_crud.get(
-            db=db, value=url_in.full_url, check=True):
+    if idempotency_key and (
+            saved := idempotency_store.get(idempotency_key)):
+        if saved.full_url != url_in.full_url:
+            logger.error(
+                'Idempotency-Key "%(key)s" was used with another URL',
+                {'key': idempotency_key}
+            )
+            idempotency_key_error()
+
+        response.status_code = saved.status_code
+        return saved.body
+
+    try:
+        (url_obj, created), shared = await create_flight.do(
+            (url_in.full_url, url_in.expires_at),
+            lambda: db_breaker.call(
+                'create', lambda: url_crud.upsert(db=db, obj_in=url_in))
+        )
+    except ValueError:
+        logger.critical('Could not generate unique short URL')
+        internal_server_error()
+    except DatabaseUnavailable:
+        logger.error('URL was not created, database is degraded')
+        service_unavailable_error()
+
+    if created and not shared:
+        logger.debug(
+            'URL "%(full_url)s" was successfully added to the DB',
+            {'full_url': url_in.full_url}
+        )
+    else:
         response.status_code = status.HTTP_302_FOUND
 
         logger.debug(
@@ -44,45 +80,99 @@ async def create_short_url(
             {'full_url': url_in.full_url}
         )
 
-        return check_url
+    url = Url.from_orm(url_obj)
 
-    value = shortener()  # this is a short url
-
-    url = await url_crud.create(
-        db=db, field='short_url', value=value, obj_in=url_in
-    )
-
-    logger.debug(
-        'URL "%(full_url)s" was successfully added to the DB',
-        {'full_url': url_in.full_url}
-    )
+    if idempotency_key:
+        idempotency_store.set(idempotency_key, SavedResponse(
+            full_url=url_in.full_url,
+            status_code=response.status_code or status.HTTP_201_CREATED,
+            body=url
+        ))
 
     return url
 
 
 @router.post(
     '/batch',
+    response_model=list[Url | UrlError],
     status_code=status.HTTP_201_CREATED
 )
 async def batch_url_upload(
     *,
-    url_list: list[UrlBase],
-    response: Response,
+    url_list: list[UrlCreate],
     db: AsyncSession = Depends(get_session),
 ) -> Any:
     """
-    Upload a list of URLs to create a short version for each one.
+    Upload a list of URLs to create a short version for each one. \n
+    URLs which are already in database are returned as they are,
+    so the same batch can be safely submitted again.
+    Items which could not be created have an `error` instead.
     """
 
     try:
-        result = await url_crud.create_multi(db=db, url_list=url_list)
-    except IntegrityError:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail='At least one of the submitted urls is already in database'
+        result = await db_breaker.call(
+            'batch', lambda: url_crud.create_multi(db=db, url_list=url_list),
+            size=len(url_list))
+    except DatabaseUnavailable:
+        logger.error('Batch was not created, database is degraded')
+        service_unavailable_error()
+
+    if failed := result.count(None):
+        logger.critical(
+            'Could not generate unique short URLs for %(count)s items',
+            {'count': failed}
         )
 
-    return result
+    logger.debug(
+        'Batch of %(count)s URLs was processed',
+        {'count': len(url_list)}
+    )
+
+    return [
+        url_obj or UrlError(
+            full_url=url_in.full_url,
+            error='Could not generate unique short URL'
+        )
+        for url_obj, url_in in zip(result, url_list)
+    ]
+
+
+@router.get(
+    '/top',
+    response_model=list[TopUrl],
+    status_code=status.HTTP_200_OK
+)
+async def get_top_urls(
+    db: AsyncSession = Depends(get_session),
+    limit: int = 10
+) -> Any:
+    """
+    Get the most frequently used URLs of this worker since its start. \n
+    Hits are approximate, `error` is the maximum overestimation.
+    """
+
+    top = analytics.hot.top(limit=limit)
+    try:
+        url_objs = {
+            url_obj.id: url_obj
+            for url_obj in await db_breaker.call(
+                'top', lambda: url_crud.get_multi(
+                    db=db, ids=[url_id for url_id, _, _ in top]))
+        }
+    except DatabaseUnavailable:
+        logger.error('Top URLs can not be found, database is degraded')
+        service_unavailable_error()
+
+    return [
+        TopUrl(
+            id=url_id,
+            short_url=url_objs[url_id].short_url,
+            full_url=url_objs[url_id].full_url,
+            hits=hits,
+            error=error
+        )
+        for url_id, hits, error in top if url_id in url_objs
+    ]
 
 
 @router.get(
@@ -94,7 +184,8 @@ async def get_url(
     db: AsyncSession = Depends(get_session),
     url_id: int,
     response: Response,
-    request: Request
+    request: Request,
+    background_tasks: BackgroundTasks
 ) -> None:
     """
     Get short URL by ID and redirect. \n
@@ -103,14 +194,20 @@ async def get_url(
     """
 
     try:
-        url_obj = await url_crud.update(
+        url_obj = await db_breaker.call('redirect', lambda: url_crud.update(
             id=url_id,
             field='clicks',
             db=db
-        )
+        ))
     except ValueError:
         logger.critical('Function got wrong args')
         internal_server_error()
+    except DatabaseUnavailable:
+        logger.error(
+            'Url with ID="%(url_id)s" can not be found, database is degraded',
+            {'url_id': url_id}
+        )
+        service_unavailable_error()
 
     try:
         if not url_obj.is_active:
@@ -122,7 +219,8 @@ async def get_url(
 
     except AttributeError:
         logger.error(
-            'Url with ID="%(url_id)s" was not found in database',
+            'Url with ID="%(url_id)s" was not found in database '
+            'or has expired',
             {'url_id': url_id}
         )
         url_not_found_error()
@@ -132,23 +230,16 @@ async def get_url(
         {'short_url': url_obj.short_url}
     )
 
-    client = get_client_address(
-        request=request
-    )
-
-    await click_crud.create(
-        url_id=url_id, client=client, db=db)
+    client = get_client_info(request=request)
 
-    logger.debug(
-        'Click object with short URL "%(short_url)s" was created',
-        {'short_url': url_obj.short_url}
-    )
+    background_tasks.add_task(
+        record_click, url_id=url_id, client=client)
 
     response.headers['Location'] = url_obj.full_url
 
     logger.debug(
         'Client "%(client)s" was redirected',
-        {'client': client}
+        {'client': client.ip}
     )
 
     return
@@ -157,7 +248,7 @@ async def get_url(
 @router.get(
     '/{url_id}/status',
     status_code=status.HTTP_200_OK,
-    response_model=list | Url
+    response_model=list | UrlStatus
 )
 async def get_url_info(
     url_id: int,
@@ -170,7 +261,15 @@ async def get_url_info(
     Get URL usage status and Click objects.
     """
 
-    url_obj = await url_crud.get(db=db, value=url_id)
+    try:
+        url_obj = await db_breaker.call(
+            'status', lambda: url_crud.get(db=db, value=url_id))
+    except DatabaseUnavailable:
+        logger.error(
+            'Url with ID="%(url_id)s" can not be found, database is degraded',
+            {'url_id': url_id}
+        )
+        service_unavailable_error()
 
     if not url_obj:
         # Код логеров я не могу вынести для переиспользования,
@@ -188,12 +287,35 @@ async def get_url_info(
         )
         url_gone_error()
 
-    if full_info:
-        clicks = await click_crud.get_multi(
-            url_id=url_obj.id, db=db, skip=offset, limit=max_result)
-        return [url_obj, clicks]
+    elif is_expired(url_obj.expires_at):
+        logger.error(
+            'Attempt to get expired URL with ID="%(url_id)s"',
+            {'url_id': url_id}
+        )
+        url_expired_error()
+
+    url_status = UrlStatus.from_orm(url_obj)
+
+    try:
+        url_status.unique_clients = await db_breaker.call(
+            'unique_clients', lambda: analytics.unique_clients(
+                url_id=url_obj.id, db=db))
+
+        if full_info:
+            clicks = await db_breaker.call(
+                'click_list', lambda: click_crud.get_multi(
+                    url_id=url_obj.id, db=db, skip=offset, limit=max_result),
+                size=max_result)
+            return [url_status, clicks]
+    except DatabaseUnavailable:
+        logger.error(
+            'Clicks of URL with ID="%(url_id)s" can not be found, '
+            'database is degraded',
+            {'url_id': url_id}
+        )
+        service_unavailable_error()
 
-    return url_obj
+    return url_status
 
 
 @router.delete(
@@ -210,11 +332,18 @@ async def delete_url(
     In fact, this is a fake.
     """
 
-    url_obj = await url_crud.update(
-        id=url_id,
-        field='is_active',
-        db=db
-    )
+    try:
+        url_obj = await db_breaker.call('delete', lambda: url_crud.update(
+            id=url_id,
+            field='is_active',
+            db=db
+        ))
+    except DatabaseUnavailable:
+        logger.error(
+            'Url with ID="%(url_id)s" was not deleted, database is degraded',
+            {'url_id': url_id}
+        )
+        service_unavailable_error()
 
     if not url_obj:
         logger.error(
@@ -223,6 +352,8 @@ async def delete_url(
         )
         url_not_found_error()
 
+    redirect_cache.pop(url_obj.short_url)
+
     logger.debug(
         'Short URL "%(short_url)s" was deleted',
         {'short_url': url_obj.short_url}
@@ -0,0 +1,73 @@
+import logging
+import re
+from functools import lru_cache
+
+from core.config import app_settings
+
+logger = logging.getLogger(__name__)
+
+BOT_RE = re.compile(r'bot|crawl|spider|slurp|curl|wget|python|http', re.I)
+TABLET_RE = re.compile(r'ipad|tablet|kindle|silk|playbook', re.I)
+MOBILE_RE = re.compile(r'mobi|iphone|ipod|android|phone|opera mini', re.I)
+
+
+@lru_cache(maxsize=4096)
+def get_device(user_agent: str | None) -> str:
+    """Get device class from the User-Agent header."""
+
+    if not user_agent:
+        return 'unknown'
+    if BOT_RE.search(user_agent):
+        return 'bot'
+    if TABLET_RE.search(user_agent):
+        return 'tablet'
+    if MOBILE_RE.search(user_agent):
+        return 'mobile'
+    return 'desktop'
+
+
+@lru_cache(maxsize=None)
+def _get_geo_reader():
+    """Open the local GeoIP database once. It is optional."""
+
+    if not app_settings.geoip_database:
+        return None
+
+    try:
+        import maxminddb
+    except ImportError:
+        logger.warning('maxminddb is not installed, GeoIP is disabled')
+        return None
+
+    try:
+        return maxminddb.open_database(app_settings.geoip_database)
+    except (OSError, ValueError):
+        logger.error(
+            'GeoIP database "%(path)s" can not be opened',
+            {'path': app_settings.geoip_database}
+        )
+        return None
+
+
+@lru_cache(maxsize=16384)
+def get_geo(client_ip: str | None) -> str | None:
+    """Get country code of the client's IP from the local GeoIP database."""
+
+    reader = _get_geo_reader()
+
+    if reader is None or client_ip is None:
+        return None
+
+    try:
+        record = reader.get(client_ip)
+    except ValueError:
+        return None
+
+    if not record:
+        return None
+
+    country = record.get('country') or record.get('registered_country')
+    if not country:
+        return None
+
+    return country.get('iso_code')
@@ -15,8 +15,29 @@ def url_gone_error():
     )
 
 
+def url_expired_error():
+    raise HTTPException(
+        status_code=status.HTTP_410_GONE,
+        detail='URL has expired.'
+    )
+
+
+def idempotency_key_error():
+    raise HTTPException(
+        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        detail='Idempotency-Key was already used with another URL.'
+    )
+
+
 def internal_server_error():
     raise HTTPException(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         detail='Internal Server Error'
     )
+
+
+def service_unavailable_error():
+    raise HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail='Service is temporarily degraded, try again later.'
+    )
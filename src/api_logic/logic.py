@@ -1,9 +1,19 @@
 import random
+from datetime import datetime
+from ipaddress import ip_address
+from typing import NamedTuple
 
 from fastapi import Request
 from nanoid import generate
 
 
+class ClientInfo(NamedTuple):
+    """Raw client data which is collected on redirect."""
+    ip: str | None
+    user_agent: str | None
+    referrer: str | None
+
+
 def shortener():
     """"Generate random unique string that can be used as a short url"""
     size = random.randint(5, 8)
@@ -11,9 +21,29 @@ def shortener():
     return url
 
 
-def get_client_address(request: Request) -> str:
-    """Get client's addres."""
+def is_expired(expires_at: datetime | None) -> bool:
+    """Check if the expiration date (naive UTC) has passed."""
+
+    return expires_at is not None and expires_at <= datetime.utcnow()
+
+
+def get_client_address(request: Request) -> str | None:
+    """Get client's IP address. The port is of no use, so it is dropped."""
+
+    if request.client is None:
+        return None
+
+    try:
+        return str(ip_address(request.client.host))
+    except ValueError:
+        return None
+
+
+def get_client_info(request: Request) -> ClientInfo:
+    """Collect client's data for the click. Parsing is done later."""
 
-    client: str = request.client.host + ':' + \
-        str(request.client.port)
-    return client
+    return ClientInfo(
+        ip=get_client_address(request=request),
+        user_agent=request.headers.get('user-agent'),
+        referrer=request.headers.get('referer'),
+    )
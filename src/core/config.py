@@ -1,17 +1,47 @@
-import os
-
-from dotenv import load_dotenv
-from pydantic import BaseSettings, PostgresDsn
-
-load_dotenv()
+from pydantic import BaseSettings, Field, validator
 
 
 class AppSettings(BaseSettings):
-    title: str = os.environ.get('PROJECT_NAME', 'UrlShortener')
-    host: str = os.environ.get('PROJECT_HOST', '127.0.0.1')
-    port: int = int(os.environ.get('PROJECT_PORT', 8080))
-    blacklisted_ips: list[str, None] = os.environ.get('BLACKLISTED_IPS', [])
-    database_dsn: PostgresDsn
+    title: str = Field('UrlShortener', env='PROJECT_NAME')
+    host: str = Field('127.0.0.1', env='PROJECT_HOST')
+    port: int = Field(8080, env='PROJECT_PORT')
+    blacklisted_ips: list[str] = []
+    database_dsn: str
+    database_echo: bool = False
+    log_level: str = 'DEBUG'
+    geoip_database: str = ''
+    analytics_top_size: int = 100
+    analytics_checkpoint_interval: float = 60
+    analytics_max_sketches: int = 10000
+    cache_size: int = 10000
+    cache_ttl: float = 60
+    cache_warmup_size: int = 1000
+    cache_warmup_timeout: float = 5
+    cache_snapshot_path: str = ''
+    cache_snapshot_interval: float = 300
+    cache_snapshot_max_age: float = 600
+    idempotency_size: int = 10000
+    idempotency_ttl: float = 24 * 3600
+    click_batch_size: int = 500
+    click_flush_interval: float = 0.5
+    db_timeout_min: float = 0.25
+    db_timeout_max: float = 2
+    breaker_failures: int = 5
+    breaker_reset_timeout: float = 10
+    click_spool_path: str = 'clicks.spool'
+    click_replay_interval: float = 5
+    expiry_sweep_interval: float = 30
+    expiry_batch_size: int = 1000
+    expiry_max_batches: int = 10
+    # seconds after expiration to delete the URL with its clicks, 0 - never
+    expiry_purge_after: float = 30 * 24 * 3600
+
+    @validator('database_dsn')
+    def check_backend(cls, value: str) -> str:
+        """PostgreSQL (asyncpg) and SQLite (aiosqlite) are supported."""
+        from db.backends import get_backend
+        get_backend(value)
+        return value
 
     class Config:
         env_file = '.env'
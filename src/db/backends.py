@@ -0,0 +1,79 @@
+from sqlalchemy import Table
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.sql.dml import Insert
+
+
+class StorageBackend:
+    """Database specific parts of the storage."""
+
+    dialect: str
+    # embedded databases get their schema on start instead of migrations
+    create_schema: bool = False
+    # clicks are buffered and written in one transaction
+    batch_writes: bool = False
+
+    def engine_options(self) -> dict:
+        return {}
+
+    def on_connect(self, dbapi_connection, connection_record) -> None:
+        pass
+
+    def insert(self, table: Table) -> Insert:
+        """Get INSERT which supports ON CONFLICT and RETURNING."""
+        raise NotImplementedError
+
+
+class PostgresBackend(StorageBackend):
+    dialect = 'postgresql'
+
+    def engine_options(self) -> dict:
+        return {'pool_pre_ping': True}
+
+    def insert(self, table: Table) -> Insert:
+        return postgresql.insert(table)
+
+
+class SQLiteBackend(StorageBackend):
+    """Embedded single-node storage, needs SQLite 3.35+ for RETURNING."""
+
+    dialect = 'sqlite'
+    create_schema = True
+    batch_writes = True
+
+    pragmas = (
+        ('journal_mode', 'WAL'),
+        ('synchronous', 'NORMAL'),
+        ('foreign_keys', 'ON'),
+        ('busy_timeout', 5000),
+        ('cache_size', -64000),  # KiB
+        ('temp_store', 'MEMORY'),
+        ('mmap_size', 256 * 1024 * 1024),
+    )
+
+    def on_connect(self, dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        for name, value in self.pragmas:
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+    def insert(self, table: Table) -> Insert:
+        return sqlite.insert(table)
+
+
+BACKENDS: dict[str, StorageBackend] = {
+    backend.dialect: backend
+    for backend in (PostgresBackend(), SQLiteBackend())
+}
+
+
+def get_backend(dsn: str) -> StorageBackend:
+    """Get the backend by DSN scheme, e.g. sqlite+aiosqlite://..."""
+
+    dialect = dsn.split(':', 1)[0].split('+', 1)[0]
+    if dialect == 'postgres':
+        dialect = 'postgresql'
+
+    if dialect not in BACKENDS:
+        raise ValueError(f'Unsupported database: {dialect}')
+
+    return BACKENDS[dialect]
@@ -1,16 +1,64 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 from core.config import app_settings
 
+from .backends import get_backend
+
 Base = declarative_base()
 
-engine = create_async_engine(app_settings.database_dsn, echo=True, future=True)
-async_session = sessionmaker(
-    engine, class_=AsyncSession, expire_on_commit=False
-)
+backend = get_backend(app_settings.database_dsn)
+
+# engine is created in the app lifespan, not on import
+engine: AsyncEngine | None = None
+async_session: sessionmaker | None = None
+
+
+def init_engine() -> None:
+    """Create the engine and the session factory."""
+
+    global engine, async_session
+
+    from sqlalchemy import event
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    engine = create_async_engine(
+        app_settings.database_dsn,
+        echo=app_settings.database_echo,
+        future=True,
+        **backend.engine_options()
+    )
+    event.listen(engine.sync_engine, 'connect', backend.on_connect)
+    async_session = sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False
+    )
+
+
+async def create_schema() -> None:
+    """Create tables of embedded databases, others use migrations."""
+
+    if not backend.create_schema:
+        return
+
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+
+async def dispose_engine() -> None:
+    """Close all connections of the engine."""
+
+    if engine is not None:
+        await engine.dispose()
+
+
+def new_session() -> AsyncSession:
+    """Get a new session, the engine must be initialized before."""
+
+    if async_session is None:
+        init_engine()
+    return async_session()
 
 
 async def get_session() -> AsyncSession:
-    async with async_session() as session:
+    async with new_session() as session:
         yield session
@@ -1,23 +1,76 @@
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 
-import uvicorn
 from fastapi import FastAPI, Request, status
 from fastapi.responses import JSONResponse, ORJSONResponse
+from sqlalchemy.exc import SQLAlchemyError
 
-from api.v1 import base
 from core.config import app_settings
+from db.db import backend, create_schema, dispose_engine, init_engine
 
 logger = logging.getLogger(__name__)
 
-app = FastAPI(
-    title=app_settings.title,
-    docs_url='/api/openapi',
-    openapi_url='/api/openapi.json',
-    default_response_class=ORJSONResponse,
-)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Prepare the worker: logging, database engine and background jobs.
+    Their state is saved on shutdown.
+    """
+
+    import coloredlogs
+
+    from services.analytics import analytics
+    from services.breaker import DatabaseUnavailable
+    from services.cache import redirect_cache, warm_up_cache
+    from services.clicks import click_buffer
+    from services.expiration import run_sweeper
+    from services.spool import click_spool
+
+    coloredlogs.install(level=app_settings.log_level)
+    init_engine()
+    await create_schema()
+
+    await warm_up_cache(cache=redirect_cache)
+
+    tasks = [
+        asyncio.create_task(analytics.run_checkpoints(
+            interval=app_settings.analytics_checkpoint_interval)),
+        asyncio.create_task(run_sweeper(
+            cache=redirect_cache,
+            interval=app_settings.expiry_sweep_interval)),
+        asyncio.create_task(click_spool.run(
+            interval=app_settings.click_replay_interval)),
+    ]
+    if backend.batch_writes:
+        tasks.append(asyncio.create_task(click_buffer.run(
+            interval=app_settings.click_flush_interval)))
+    if app_settings.cache_snapshot_path:
+        tasks.append(asyncio.create_task(redirect_cache.run_snapshots(
+            path=app_settings.cache_snapshot_path,
+            interval=app_settings.cache_snapshot_interval)))
+
+    yield
+
+    for task in tasks:
+        task.cancel()
+
+    if app_settings.cache_snapshot_path:
+        try:
+            redirect_cache.save_snapshot(path=app_settings.cache_snapshot_path)
+        except OSError:
+            logger.exception('Redirect cache snapshot was not saved')
+
+    try:
+        await click_buffer.flush()
+        await analytics.save()
+    except (SQLAlchemyError, OSError, DatabaseUnavailable):
+        logger.exception('Clicks or analytics were not saved on shutdown')
+
+    await dispose_engine()
 
 
-@app.middleware('http')
 async def validate_ip(request: Request, call_next):
     """Check if the client's IP is in the black list"""
 
@@ -37,11 +90,38 @@ async def validate_ip(request: Request, call_next):
     return await call_next(request)
 
 
-app.include_router(base.api_router, prefix='/api/v1')
+def create_app() -> FastAPI:
+    """Application factory."""
+
+    from api.v1 import base
+
+    app = FastAPI(
+        title=app_settings.title,
+        lifespan=lifespan,
+        docs_url='/api/openapi',
+        openapi_url='/api/openapi.json',
+        default_response_class=ORJSONResponse,
+    )
+    app.middleware('http')(validate_ip)
+    app.include_router(base.api_router, prefix='/api/v1')
+
+    return app
+
+
+def __getattr__(name: str):
+    # `main:app` still works, the app is built on the first access only
+    if name == 'app':
+        globals()['app'] = create_app()
+        return globals()['app']
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
 
 if __name__ == '__main__':
+    import uvicorn
+
     uvicorn.run(
-        'main:app',
+        'main:create_app',
+        factory=True,
         host=app_settings.host,
         port=app_settings.port,
         reload=True
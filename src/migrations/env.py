@@ -2,16 +2,13 @@ import asyncio
 from logging.config import fileConfig
 
 from alembic import context
-from dotenv import load_dotenv
 from sqlalchemy import engine_from_config, pool
 from sqlalchemy.engine import Connection
 from sqlalchemy.ext.asyncio import AsyncEngine
 
 from core.config import app_settings
 from db.db import Base
-from models.entity import Url, Click  # noqa
-
-load_dotenv()
+from models.entity import Click, Url, UrlSketch  # noqa
 
 config = context.config
 config.set_main_option('sqlalchemy.url', app_settings.database_dsn)
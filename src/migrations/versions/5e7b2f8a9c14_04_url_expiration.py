@@ -0,0 +1,36 @@
+"""04_url-expiration
+
+Revision ID: 5e7b2f8a9c14
+Revises: d4a9b3c1e5f2
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = '5e7b2f8a9c14'
+down_revision = 'd4a9b3c1e5f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('urls', sa.Column('expires_at', sa.DateTime(), nullable=True))
+    op.create_index(op.f('ix_urls_expires_at'), 'urls', ['expires_at'], unique=False)
+    op.create_index(op.f('ix_clicks_url_id'), 'clicks', ['url_id'], unique=False)
+    # purged URLs take their clicks and sketches with them
+    op.drop_constraint('clicks_url_id_fkey', 'clicks', type_='foreignkey')
+    op.create_foreign_key('clicks_url_id_fkey', 'clicks', 'urls', ['url_id'], ['id'], ondelete='CASCADE')
+    op.drop_constraint('url_sketches_url_id_fkey', 'url_sketches', type_='foreignkey')
+    op.create_foreign_key('url_sketches_url_id_fkey', 'url_sketches', 'urls', ['url_id'], ['id'], ondelete='CASCADE')
+
+
+def downgrade() -> None:
+    op.drop_constraint('url_sketches_url_id_fkey', 'url_sketches', type_='foreignkey')
+    op.create_foreign_key('url_sketches_url_id_fkey', 'url_sketches', 'urls', ['url_id'], ['id'])
+    op.drop_constraint('clicks_url_id_fkey', 'clicks', type_='foreignkey')
+    op.create_foreign_key('clicks_url_id_fkey', 'clicks', 'urls', ['url_id'], ['id'])
+    op.drop_index(op.f('ix_clicks_url_id'), table_name='clicks')
+    op.drop_index(op.f('ix_urls_expires_at'), table_name='urls')
+    op.drop_column('urls', 'expires_at')
@@ -0,0 +1,45 @@
+"""02_click-enrichment
+
+Revision ID: 8c1f0e6a2d37
+Revises: 413924614894
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '8c1f0e6a2d37'
+down_revision = '413924614894'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('clicks', sa.Column('client_ip', postgresql.INET(), nullable=True))
+    op.add_column('clicks', sa.Column('user_agent', sa.String(length=512), nullable=True))
+    op.add_column('clicks', sa.Column('referrer', sa.String(length=1000), nullable=True))
+    op.add_column('clicks', sa.Column('device', sa.String(length=16), nullable=True))
+    op.add_column('clicks', sa.Column('geo', sa.String(length=8), nullable=True))
+    # "host:port" -> host, values which are not IP addresses are left empty
+    op.execute(
+        """
+        UPDATE clicks
+        SET client_ip = regexp_replace(client, ':[0-9]+$', '')::inet
+        WHERE client ~ '^([0-9]{1,3}\\.){3}[0-9]{1,3}:[0-9]+$'
+            OR client ~ '^[0-9a-fA-F:]*:[0-9a-fA-F]*:[0-9]+$'
+        """
+    )
+    op.drop_column('clicks', 'client')
+
+
+def downgrade() -> None:
+    op.add_column('clicks', sa.Column('client', sa.String(length=100), nullable=True))
+    op.execute("UPDATE clicks SET client = coalesce(host(client_ip), '')")
+    op.alter_column('clicks', 'client', nullable=False)
+    op.drop_column('clicks', 'geo')
+    op.drop_column('clicks', 'device')
+    op.drop_column('clicks', 'referrer')
+    op.drop_column('clicks', 'user_agent')
+    op.drop_column('clicks', 'client_ip')
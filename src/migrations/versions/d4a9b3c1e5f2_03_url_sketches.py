@@ -0,0 +1,29 @@
+"""03_url-sketches
+
+Revision ID: d4a9b3c1e5f2
+Revises: 8c1f0e6a2d37
+Create Date: 2026-10-19 13:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = 'd4a9b3c1e5f2'
+down_revision = '8c1f0e6a2d37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('url_sketches',
+    sa.Column('url_id', sa.Integer(), nullable=False),
+    sa.Column('visitors', sa.LargeBinary(), nullable=False),
+    sa.Column('updated', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['url_id'], ['urls.id'], ),
+    sa.PrimaryKeyConstraint('url_id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('url_sketches')
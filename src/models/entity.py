@@ -1,9 +1,12 @@
 from datetime import datetime
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy import (Boolean, Column, DateTime, ForeignKey, Integer,
+                        LargeBinary, String)
 
 from db.db import Base
 
+from .types import IPAddress
+
 
 class Url(Base):
     __tablename__ = 'urls'
@@ -12,11 +15,26 @@ class Url(Base):
     short_url = Column(String(100), unique=True, nullable=False)
     clicks = Column(Integer, unique=False, default=0)
     is_active = Column(Boolean, default=True)
+    expires_at = Column(DateTime, nullable=True, index=True)
 
 
 class Click(Base):
     __tablename__ = 'clicks'
     id = Column(Integer, primary_key=True)
-    url_id = Column(Integer, ForeignKey('urls.id'))
+    url_id = Column(
+        Integer, ForeignKey('urls.id', ondelete='CASCADE'), index=True)
     date = Column(DateTime, index=True, default=datetime.utcnow)
-    client = Column(String(100), unique=False, nullable=False)
+    client_ip = Column(IPAddress, unique=False, nullable=True)
+    user_agent = Column(String(512), nullable=True)
+    referrer = Column(String(1000), nullable=True)
+    device = Column(String(16), nullable=True)
+    geo = Column(String(8), nullable=True)
+
+
+class UrlSketch(Base):
+    __tablename__ = 'url_sketches'
+    url_id = Column(
+        Integer, ForeignKey('urls.id', ondelete='CASCADE'), primary_key=True)
+    visitors = Column(LargeBinary, nullable=False)
+    updated = Column(
+        DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -0,0 +1,40 @@
+from ipaddress import IPv4Address, IPv6Address, ip_address
+
+from sqlalchemy import LargeBinary
+from sqlalchemy.dialects.postgresql import INET
+from sqlalchemy.types import TypeDecorator
+
+
+class IPAddress(TypeDecorator):
+    """
+    Client IP address.
+    Stored as `inet` in PostgreSQL and as packed bytes in other databases.
+    """
+
+    impl = LargeBinary(16)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if dialect.name == 'postgresql':
+            return dialect.type_descriptor(INET())
+        return dialect.type_descriptor(LargeBinary(16))
+
+    def process_bind_param(
+        self, value, dialect
+    ) -> str | bytes | None:
+        if value is None:
+            return None
+        address = ip_address(value)
+        if dialect.name == 'postgresql':
+            return str(address)
+        return address.packed
+
+    def process_result_value(
+        self, value, dialect
+    ) -> IPv4Address | IPv6Address | None:
+        if value is None:
+            return None
+        if isinstance(value, bytes):
+            return ip_address(value)
+        # asyncpg may return an interface like 10.0.0.1/32
+        return ip_address(str(value).split('/')[0])
@@ -1,6 +1,6 @@
-from datetime import datetime
+from datetime import datetime, timezone
 
-from pydantic import BaseModel, HttpUrl
+from pydantic import BaseModel, HttpUrl, IPvAnyAddress, validator
 
 
 class Settings(BaseModel):
@@ -11,6 +11,26 @@ class Settings(BaseModel):
 class UrlBase(BaseModel):
     """Shared url properties"""
     full_url: HttpUrl
+    expires_at: datetime | None = None
+
+    @validator('expires_at')
+    def to_naive_utc(cls, value: datetime | None) -> datetime | None:
+        """Dates are stored in UTC without time zone."""
+        if value is None:
+            return value
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+
+class UrlCreate(UrlBase):
+    """Url properties on creation"""
+
+    @validator('expires_at')
+    def in_future(cls, value: datetime | None) -> datetime | None:
+        if value is not None and value <= datetime.utcnow():
+            raise ValueError('expiration date must be in the future')
+        return value
 
 
 class Url(UrlBase, Settings):
@@ -21,9 +41,33 @@ class Url(UrlBase, Settings):
     is_active: bool
 
 
+class UrlError(BaseModel):
+    """Url of a batch which was not created"""
+    full_url: HttpUrl
+    error: str
+
+
+class UrlStatus(Url):
+    """Url properties with usage statistics"""
+    unique_clients: int = 0
+
+
+class TopUrl(Settings):
+    """Frequently used url"""
+    id: int
+    short_url: str
+    full_url: HttpUrl
+    hits: int
+    error: int
+
+
 class ClickInfo(Settings):
     """Information about certain url click"""
     id: int
     url_id: int
     date: datetime
-    client: str
+    client_ip: IPvAnyAddress | None
+    user_agent: str | None
+    referrer: str | None
+    device: str | None
+    geo: str | None
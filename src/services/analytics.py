@@ -0,0 +1,258 @@
+import asyncio
+import logging
+import math
+import struct
+from hashlib import blake2b
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import select
+
+from core.config import app_settings
+from db.db import new_session
+from models.entity import Url as UrlModel
+from models.entity import UrlSketch
+
+from .breaker import DatabaseUnavailable, db_breaker
+
+logger = logging.getLogger(__name__)
+
+
+class SpaceSaving:
+    """
+    Space-Saving top-K counter.
+    Keeps `size` counters, the rarest one is replaced by a new key
+    and the new key inherits its count as a possible error.
+    """
+
+    def __init__(self, size: int):
+        self._size = size
+        self._counters: dict[int, list[int]] = {}  # key: [count, error]
+
+    def add(self, key: int) -> None:
+        if key in self._counters:
+            self._counters[key][0] += 1
+            return
+
+        if len(self._counters) < self._size:
+            self._counters[key] = [1, 0]
+            return
+
+        victim = min(self._counters, key=lambda k: self._counters[k][0])
+        count = self._counters.pop(victim)[0]
+        self._counters[key] = [count + 1, count]
+
+    def top(self, limit: int) -> list[tuple[int, int, int]]:
+        """Get (key, count, error) of the most frequent keys."""
+
+        items = sorted(
+            self._counters.items(), key=lambda item: item[1][0], reverse=True)
+        return [(key, count, error) for key, (count, error) in items[:limit]]
+
+
+class HyperLogLog:
+    """
+    HyperLogLog sketch for counting distinct values.
+    Small sketches are kept sparse, as most links have few clients:
+    only non-zero registers are stored, 3 bytes each in binary form.
+    The sketch becomes dense when there are more than `sparse_limit`.
+    """
+
+    precision = 12
+    size = 1 << precision
+    sparse_limit = 32
+    sparse_item = struct.Struct('>HB')  # register index, rank
+
+    def __init__(self, registers: bytes | None = None):
+        self._sparse: dict[int, int] | None = None
+        self._registers: bytearray | None = None
+
+        if registers is not None and len(registers) == self.size:
+            self._registers = bytearray(registers)
+        else:
+            self._sparse = dict(
+                self.sparse_item.iter_unpack(registers or b''))
+
+    def add(self, value: str) -> None:
+        hashed = int.from_bytes(
+            blake2b(value.encode(), digest_size=8).digest(), 'big')
+        index = hashed >> (64 - self.precision)
+        rest = hashed & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        self._set(index, rank)
+
+    def _set(self, index: int, rank: int) -> None:
+        if self._registers is not None:
+            if rank > self._registers[index]:
+                self._registers[index] = rank
+            return
+
+        if rank > self._sparse.get(index, 0):
+            self._sparse[index] = rank
+            if len(self._sparse) > self.sparse_limit:
+                self._registers = self._dense()
+                self._sparse = None
+
+    def _dense(self) -> bytearray:
+        if self._registers is not None:
+            return self._registers
+
+        registers = bytearray(self.size)
+        for index, rank in self._sparse.items():
+            registers[index] = rank
+        return registers
+
+    def merge(self, other: 'HyperLogLog') -> None:
+        if other._registers is None:
+            for index, rank in other._sparse.items():
+                self._set(index, rank)
+            return
+
+        self._registers = bytearray(
+            map(max, self._dense(), other._registers))
+        self._sparse = None
+
+    def count(self) -> int:
+        registers = self._dense()
+        alpha = 0.7213 / (1 + 1.079 / self.size)
+        estimate = alpha * self.size ** 2 / sum(
+            2.0 ** -register for register in registers)
+        zeros = registers.count(0)
+        if estimate <= 2.5 * self.size and zeros:
+            # small range correction
+            estimate = self.size * math.log(self.size / zeros)
+        return round(estimate)
+
+    def to_bytes(self) -> bytes:
+        if self._registers is not None:
+            return bytes(self._registers)
+        return b''.join(
+            self.sparse_item.pack(index, rank)
+            for index, rank in self._sparse.items())
+
+
+class StreamAnalytics:
+    """
+    In-process analytics which is fed by the click path.
+    Hot links are counted per worker, unique clients sketches
+    are merged into the database on checkpoint.
+    At most `max_sketches` links are tracked between checkpoints,
+    clients of other links are not counted until the next one.
+    """
+
+    def __init__(self, top_size: int, max_sketches: int):
+        self.hot = SpaceSaving(size=top_size)
+        self._max_sketches = max_sketches
+        self._sketches: dict[int, HyperLogLog] = {}
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return len(self._sketches)
+
+    def add(self, url_id: int, client_ip: str | None) -> None:
+        self.hot.add(url_id)
+
+        if client_ip is None:
+            return
+
+        if url_id not in self._sketches:
+            if len(self._sketches) >= self._max_sketches:
+                self.dropped += 1
+                return
+            self._sketches[url_id] = HyperLogLog()
+        self._sketches[url_id].add(client_ip)
+
+    async def unique_clients(self, url_id: int, db: AsyncSession) -> int:
+        """Get approximate count of distinct clients of the URL."""
+
+        sketch = HyperLogLog()
+
+        statement = select(UrlSketch.visitors).where(
+            UrlSketch.url_id == url_id)
+        results = await db.execute(statement=statement)
+        if stored := results.scalar_one_or_none():
+            sketch.merge(HyperLogLog(stored))
+
+        if url_id in self._sketches:
+            sketch.merge(self._sketches[url_id])
+
+        return sketch.count()
+
+    async def checkpoint(self, db: AsyncSession) -> None:
+        """
+        Merge local sketches into the stored ones.
+        Sketches of URLs which were purged meanwhile are dropped.
+        """
+
+        if not self._sketches:
+            return
+
+        sketches, self._sketches = self._sketches, {}
+
+        try:
+            statement = select(UrlSketch).where(
+                UrlSketch.url_id.in_(sketches)).with_for_update()
+            results = await db.execute(statement=statement)
+            stored = {obj.url_id: obj for obj in results.scalars().all()}
+
+            statement = select(UrlModel.id).where(UrlModel.id.in_(
+                [url_id for url_id in sketches if url_id not in stored]))
+            results = await db.execute(statement=statement)
+            existing = set(results.scalars().all())
+
+            for url_id, sketch in sketches.items():
+                if url_id in stored:
+                    sketch.merge(HyperLogLog(stored[url_id].visitors))
+                    stored[url_id].visitors = sketch.to_bytes()
+                elif url_id in existing:
+                    db.add(UrlSketch(
+                        url_id=url_id, visitors=sketch.to_bytes()))
+
+            await db.commit()
+        except BaseException:
+            # keep the data until the next checkpoint,
+            # the session is rolled back when it is closed
+            self._restore(sketches)
+            raise
+
+        logger.debug(
+            'Sketches of %(count)s URLs were saved',
+            {'count': len(sketches)}
+        )
+
+    def _restore(self, sketches: dict[int, HyperLogLog]) -> None:
+        for url_id, sketch in sketches.items():
+            if url_id in self._sketches:
+                sketch.merge(self._sketches[url_id])
+            elif len(self._sketches) >= self._max_sketches:
+                self.dropped += 1
+                continue
+            self._sketches[url_id] = sketch
+
+    async def save(self) -> None:
+        """Run the checkpoint in a new session through the breaker."""
+
+        async def checkpoint() -> None:
+            async with new_session() as db:
+                await self.checkpoint(db=db)
+
+        await db_breaker.call(
+            'checkpoint', checkpoint, size=len(self._sketches))
+
+    async def run_checkpoints(self, interval: float) -> None:
+        """Save sketches to the database periodically."""
+
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.save()
+            except DatabaseUnavailable:
+                logger.warning('Analytics checkpoint was postponed')
+            except SQLAlchemyError:
+                logger.exception('Analytics checkpoint failed')
+
+
+analytics = StreamAnalytics(
+    top_size=app_settings.analytics_top_size,
+    max_sketches=app_settings.analytics_max_sketches
+)
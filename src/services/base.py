@@ -3,17 +3,23 @@ from typing import Any, Generic, Type, TypeVar
 
 from fastapi.encoders import jsonable_encoder
 from pydantic import BaseModel
-from sqlalchemy import update
+from sqlalchemy import delete, or_, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import select
 
-from api_logic.logic import shortener
-from db.db import Base
+from api_logic.logic import is_expired, shortener
+from db.db import Base, backend
 
 ModelType = TypeVar('ModelType', bound=Base)
 CreateSchemaType = TypeVar('CreateSchemaType', bound=BaseModel)
 UpdateSchemaType = TypeVar('UpdateSchemaType', bound=BaseModel)
 
+SHORT_URL_ATTEMPTS = 5
+# items per statement, keeps bind parameters under the driver limit
+CHUNK_SIZE = 1000
+KEEP_DATETIME = {datetime: lambda value: value}
+
 
 class CRUD:
 
@@ -56,6 +62,18 @@ class UrlCRUD(
 
         return results.scalar_one_or_none()
 
+    async def get_multi(
+        self, db: AsyncSession, ids: list[int]
+    ) -> list[ModelType]:
+        """Get active objects by their IDs."""
+
+        statement = select(self._model).where(
+            self._model.id.in_(ids)).where(
+                self._model.is_active == True)  # noqa
+        results = await db.execute(statement=statement)
+
+        return results.scalars().all()
+
     async def create(
         self,
         db: AsyncSession,
@@ -66,7 +84,7 @@ class UrlCRUD(
     ) -> ModelType:
         """Create the object."""
 
-        obj_in_data = jsonable_encoder(obj_in)
+        obj_in_data = jsonable_encoder(obj_in, custom_encoder=KEEP_DATETIME)
         db_obj = self._model(**obj_in_data)
 
         if field and value:
@@ -78,26 +96,171 @@ class UrlCRUD(
 
         return db_obj
 
+    async def upsert(
+        self,
+        db: AsyncSession,
+        obj_in: CreateSchemaType
+    ) -> tuple[ModelType, bool]:
+        """
+        Create the object or get the existing one with the same full URL.
+        The insert is atomic, so concurrent workers do not fail
+        on the unique constraint. Returns the object and whether
+        it was created.
+        """
+
+        obj_in_data = jsonable_encoder(obj_in, custom_encoder=KEEP_DATETIME)
+
+        for _ in range(SHORT_URL_ATTEMPTS):
+            statement = backend.insert(self._model.__table__).values(
+                {**obj_in_data, 'short_url': shortener()}
+            ).on_conflict_do_nothing().returning(*self._model.__table__.c)
+
+            results = await db.execute(statement=statement)
+            url_obj = results.one_or_none()
+            await db.commit()
+
+            if url_obj is not None:
+                return url_obj, True
+
+            # either the full url is already in DB
+            # or the short url is already taken
+            found = await self._get_by_full_urls(
+                db=db, full_urls=[obj_in_data['full_url']])
+            if not found:
+                continue
+
+            url_obj = found[obj_in_data['full_url']]
+            if not self._is_dead(url_obj):
+                return url_obj, False
+
+            url_obj = await self._revive(
+                db=db, url_obj=url_obj,
+                expires_at=obj_in_data.get('expires_at'))
+            if url_obj is None:
+                break
+            return url_obj, True
+
+        raise ValueError
+
     async def create_multi(
         self,
         db: AsyncSession,
         url_list: list[CreateSchemaType]
-    ) -> ModelType:
-        """Create several objects in one time."""
+    ) -> list[ModelType | None]:
+        """
+        Create several objects in one time.
+
+        Duplicates are collapsed in memory, URLs that are already in DB
+        are looked up with a single query and only new ones are inserted.
+        Items which lost a short URL collision are retried on their own.
+        Result keeps the order of the input list, items which still
+        have no unique short URL after all attempts are None.
+        Large lists are sent in chunks of CHUNK_SIZE items.
+        """
+
+        data_list = jsonable_encoder(url_list, custom_encoder=KEEP_DATETIME)
+        items: dict[str, dict] = {}
+        for obj in data_list:
+            # the first occurrence wins
+            items.setdefault(obj['full_url'], obj)
+
+        found = await self._get_by_full_urls(db=db, full_urls=list(items))
+        pending = [url for url in items if url not in found]
+
+        for _ in range(SHORT_URL_ATTEMPTS):
+            if not pending:
+                break
+
+            for position in range(0, len(pending), CHUNK_SIZE):
+                statement = backend.insert(self._model.__table__).values([
+                    {**items[url], 'short_url': shortener()}
+                    for url in pending[position:position + CHUNK_SIZE]
+                ]).on_conflict_do_nothing().returning(
+                    *self._model.__table__.c)
+
+                results = await db.execute(statement=statement)
+                found.update({row.full_url: row for row in results.all()})
+            pending = [url for url in pending if url not in found]
+
+            if pending:
+                # skipped rows were either added by a concurrent request
+                # or got a short url which is already taken
+                found.update(await self._get_by_full_urls(
+                    db=db, full_urls=pending))
+                pending = [url for url in pending if url not in found]
 
-        data_list = jsonable_encoder(url_list)
+        await db.commit()
 
-        for url_obj in data_list:
-            url_obj['short_url'] = shortener()
+        for url, url_obj in list(found.items()):
+            if self._is_dead(url_obj):
+                found[url] = await self._revive(
+                    db=db, url_obj=url_obj,
+                    expires_at=items[url].get('expires_at'))
 
-        statement = self._model.__table__.insert().values(
-            data_list).returning(self._model)
+        return [found.get(obj['full_url']) for obj in data_list]
 
-        result = await db.execute(statement=statement)
+    @staticmethod
+    def _is_dead(url_obj: ModelType) -> bool:
+        return not url_obj.is_active or is_expired(url_obj.expires_at)
 
-        await db.commit()
+    async def _revive(
+        self,
+        db: AsyncSession,
+        url_obj: ModelType,
+        expires_at: datetime | None
+    ) -> ModelType | None:
+        """
+        Make a deleted or expired object active again with a new
+        short URL, so the old one stays dead. Commits on its own.
+        """
 
-        return result.all()
+        for _ in range(SHORT_URL_ATTEMPTS):
+            statement = update(self._model).where(
+                self._model.id == url_obj.id).where(or_(
+                    self._model.is_active == False,  # noqa
+                    self._model.expires_at <= datetime.utcnow()
+                )).values({
+                    'short_url': shortener(),
+                    'is_active': True,
+                    'expires_at': expires_at,
+                }).returning(*self._model.__table__.c)
+
+            try:
+                results = await db.execute(statement=statement)
+            except IntegrityError:
+                # short url is already taken
+                await db.rollback()
+                continue
+
+            revived = results.one_or_none()
+            await db.commit()
+
+            if revived is None:
+                # it was revived by a concurrent request
+                statement = select(*self._model.__table__.c).where(
+                    self._model.id == url_obj.id)
+                revived = (await db.execute(statement=statement)).one()
+
+            return revived
+
+        return None
+
+    async def _get_by_full_urls(
+        self,
+        db: AsyncSession,
+        full_urls: list[str]
+    ) -> dict[str, ModelType]:
+        """Get existing objects by their full URLs."""
+
+        found: dict[str, ModelType] = {}
+        for position in range(0, len(full_urls), CHUNK_SIZE):
+            statement = select(*self._model.__table__.c).where(
+                self._model.full_url.in_(
+                    full_urls[position:position + CHUNK_SIZE]))
+            results = await db.execute(statement=statement)
+            found.update({row.full_url: row for row in results.all()})
+
+        return found
 
     async def update(
         self,
@@ -109,19 +272,26 @@ class UrlCRUD(
         """Update the Url object."""
 
         if field == 'clicks':
-            # case then it is needed to increment 'click' value
+            # case then it is needed to increment 'click' value,
+            # expired objects are not counted even before the sweep
+            not_expired = or_(
+                self._model.expires_at.is_(None),
+                self._model.expires_at > datetime.utcnow()
+            )
             if id:
                 statement = update(self._model).where(
                     self._model.id == id).where(
-                        self._model.is_active == True).values(  # noqa
-                            {field: self._model.clicks + 1}).returning(
-                                self._model)
+                        self._model.is_active == True).where(  # noqa
+                            not_expired).values(
+                                {field: self._model.clicks + 1}).returning(
+                                    *self._model.__table__.c)
             elif short_url:
                 statement = update(self._model).where(
                     self._model.short_url == short_url).where(
-                        self._model.is_active == True).values(  # noqa
-                            {field: self._model.clicks + 1}
-                ).returning(self._model)
+                        self._model.is_active == True).where(  # noqa
+                            not_expired).values(
+                                {field: self._model.clicks + 1}
+                ).returning(*self._model.__table__.c)
             else:
                 raise ValueError
         else:
@@ -129,7 +299,7 @@ class UrlCRUD(
             statement = update(self._model).where(
                 self._model.id == id).where(
                     self._model.is_active == True).values(  # noqa
-                        {field: False}).returning(self._model)
+                        {field: False}).returning(*self._model.__table__.c)
 
         results = await db.execute(statement=statement)
         url_obj = results.one_or_none()
@@ -138,6 +308,62 @@ class UrlCRUD(
 
         return url_obj
 
+    async def add_clicks(
+        self, db: AsyncSession, counts: dict[int, int]
+    ) -> None:
+        """Increment clicks of several objects, the caller commits."""
+
+        for id, count in counts.items():
+            statement = update(self._model).where(
+                self._model.id == id).where(
+                    self._model.is_active == True).values(  # noqa
+                        {'clicks': self._model.clicks + count})
+            await db.execute(statement=statement)
+
+    async def deactivate_expired(
+        self, db: AsyncSession, now: datetime, limit: int
+    ) -> list[str]:
+        """
+        Deactivate a batch of expired objects.
+        Returns their short URLs.
+        """
+
+        expired = select(self._model.id).where(
+            self._model.expires_at <= now).where(
+                self._model.is_active == True).limit(  # noqa
+                    limit).with_for_update(skip_locked=True)
+        statement = update(self._model).where(
+            self._model.id.in_(expired.scalar_subquery())).values(
+                {'is_active': False}).returning(self._model.short_url)
+
+        results = await db.execute(statement=statement)
+        short_urls = results.scalars().all()
+
+        await db.commit()
+
+        return short_urls
+
+    async def purge_expired(
+        self, db: AsyncSession, before: datetime, limit: int
+    ) -> int:
+        """
+        Delete a batch of objects which expired before the given time.
+        Their clicks are deleted by the database as well.
+        """
+
+        expired = select(self._model.id).where(
+            self._model.expires_at <= before).where(
+                self._model.is_active == False).limit(  # noqa
+                    limit).with_for_update(skip_locked=True)
+        statement = delete(self._model).where(
+            self._model.id.in_(expired.scalar_subquery()))
+
+        results = await db.execute(statement=statement)
+
+        await db.commit()
+
+        return results.rowcount
+
 
 class ClickCRUD(
     CRUD, Generic[ModelType, CreateSchemaType]
@@ -160,18 +386,23 @@ class ClickCRUD(
     async def create(
         self,
         url_id: int,
-        client: str,
-        db: AsyncSession
+        db: AsyncSession,
+        **fields: Any
     ) -> None:
         """Create the Click object."""
 
-        click_obj: Type[ModelType] = self._model(
-            url_id=url_id,
-            date=datetime.now(),
-            client=client
-        )
+        fields.setdefault('date', datetime.now())
+        click_obj: Type[ModelType] = self._model(url_id=url_id, **fields)
 
         db.add(click_obj)
         await db.commit()
-        await db.refresh(click_obj)
         return
+
+    async def create_multi(
+        self,
+        db: AsyncSession,
+        clicks: list[dict[str, Any]]
+    ) -> None:
+        """Create several Click objects, the caller commits."""
+
+        await db.execute(self._model.__table__.insert(), clicks)
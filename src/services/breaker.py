@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable
+
+from async_timeout import timeout
+from sqlalchemy.exc import InterfaceError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from core.config import app_settings
+
+logger = logging.getLogger(__name__)
+
+# errors which mean the database is slow or down, not that the query is bad
+FAILURES = (
+    asyncio.TimeoutError, OperationalError, InterfaceError,
+    PoolTimeoutError, OSError
+)
+
+
+class DatabaseUnavailable(Exception):
+    """The database call was rejected or failed, the service is degraded."""
+
+
+class AdaptiveTimeout:
+    """
+    Timeout which follows the observed latency,
+    like TCP retransmission timeout: mean + 4 * deviation.
+    """
+
+    def __init__(self, minimum: float, maximum: float):
+        self._minimum = minimum
+        self._maximum = maximum
+        self._mean: float | None = None
+        self._deviation = 0.0
+
+    @property
+    def value(self) -> float:
+        return self.scaled(size=1)
+
+    def scaled(self, size: int) -> float:
+        """Timeout of a call which handles `size` items."""
+
+        if self._mean is None:
+            return self._maximum * size
+        return min(
+            max((self._mean + 4 * self._deviation) * size, self._minimum),
+            self._maximum * size
+        )
+
+    @property
+    def latency(self) -> float | None:
+        return self._mean
+
+    def observe(self, latency: float) -> None:
+        """Add the latency of a call, per item for multi-item calls."""
+
+        if self._mean is None:
+            self._mean = latency
+            self._deviation = latency / 2
+            return
+        self._deviation += (abs(latency - self._mean) - self._deviation) / 4
+        self._mean += (latency - self._mean) / 8
+
+
+class CircuitBreaker:
+    """
+    Stops calling the database after several failures in a row.
+    After `reset_timeout` one probe call is let through,
+    its success closes the breaker again.
+    Every kind of call has its own adaptive timeout,
+    as a batch insert is much slower than a lookup.
+    Timeouts of calls with a client-sized number of items
+    are tracked per item and scaled by that number.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(
+        self, failures: int, reset_timeout: float,
+        timeout_min: float, timeout_max: float
+    ):
+        self._max_failures = failures
+        self._reset_timeout = reset_timeout
+        self._timeout_min = timeout_min
+        self._timeout_max = timeout_max
+        self.timeouts: dict[str, AdaptiveTimeout] = {}
+        self._failures = 0
+        self._opened = 0.0
+        self._probing = False
+        self.state = self.CLOSED
+        self.rejected = 0
+        self.failed = 0
+
+    @property
+    def degraded(self) -> bool:
+        return self.state != self.CLOSED
+
+    def allow(self) -> bool:
+        """Check if a call may be made now."""
+
+        if self.state == self.OPEN:
+            if time.monotonic() - self._opened < self._reset_timeout:
+                return False
+            self.state = self.HALF_OPEN
+
+        if self.state == self.HALF_OPEN:
+            return not self._probing
+
+        return True
+
+    async def call(
+        self, operation: str, func: Callable[[], Awaitable[Any]],
+        size: int = 1
+    ) -> Any:
+        """
+        Make the database call or raise DatabaseUnavailable.
+        `size` is the number of items the call handles.
+        """
+
+        if not self.allow():
+            self.rejected += 1
+            raise DatabaseUnavailable
+
+        # an empty batch is as fast as a single item
+        size = max(size, 1)
+
+        if operation not in self.timeouts:
+            self.timeouts[operation] = AdaptiveTimeout(
+                minimum=self._timeout_min, maximum=self._timeout_max)
+        call_timeout = self.timeouts[operation]
+
+        probe = self.state == self.HALF_OPEN
+        self._probing = probe
+        started = time.perf_counter()
+
+        try:
+            async with timeout(call_timeout.scaled(size=size)):
+                result = await func()
+        except FAILURES as error:
+            self._on_failure()
+            raise DatabaseUnavailable from error
+        finally:
+            if probe:
+                self._probing = False
+
+        call_timeout.observe((time.perf_counter() - started) / size)
+        self._on_success()
+
+        return result
+
+    def _on_success(self) -> None:
+        if self.state != self.CLOSED:
+            logger.warning('Database is available again')
+        self.state = self.CLOSED
+        self._failures = 0
+
+    def _on_failure(self) -> None:
+        self.failed += 1
+        self._failures += 1
+
+        if self.state == self.HALF_OPEN or (
+                self._failures >= self._max_failures):
+            if self.state != self.OPEN:
+                logger.error('Database is not available, degraded mode is on')
+            self.state = self.OPEN
+            self._opened = time.monotonic()
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            'state': self.state,
+            'degraded': self.degraded,
+            'timeouts': {
+                operation: {
+                    'timeout': call_timeout.value,
+                    'latency': call_timeout.latency,
+                }
+                for operation, call_timeout in self.timeouts.items()
+            },
+            'rejected': self.rejected,
+            'failed': self.failed,
+        }
+
+
+db_breaker = CircuitBreaker(
+    failures=app_settings.breaker_failures,
+    reset_timeout=app_settings.breaker_reset_timeout,
+    timeout_min=app_settings.db_timeout_min,
+    timeout_max=app_settings.db_timeout_max
+)
@@ -0,0 +1,264 @@
+import asyncio
+import heapq
+import logging
+import mmap
+import os
+import struct
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import NamedTuple
+
+from async_timeout import timeout
+from sqlalchemy import or_
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql import select
+
+from core.config import app_settings
+from db.db import new_session
+from models.entity import Url as UrlModel
+
+logger = logging.getLogger(__name__)
+
+# stale heap items which are allowed before the heap is rebuilt
+HEAP_SLACK = 64
+
+SNAPSHOT_MAGIC = b'URC2'
+# id, expiration timestamp (0 if none), short url size, full url size
+SNAPSHOT_RECORD = struct.Struct('<IdHH')
+
+
+class CachedUrl(NamedTuple):
+    id: int
+    full_url: str
+    expires_at: datetime | None = None
+
+    def is_expired(self, now: datetime) -> bool:
+        return self.expires_at is not None and self.expires_at <= now
+
+
+class RedirectCache:
+    """
+    LRU cache of short URL -> redirect target.
+    Entries live `ttl` seconds, so a deletion made by another worker
+    is noticed in bounded time. Entries of expiring URLs are also kept
+    in a heap, so they are evicted without scanning the whole cache.
+    """
+
+    def __init__(self, size: int, ttl: float):
+        self._size = size
+        self._ttl = ttl
+        # short url: (cached url, time it was stored)
+        self._entries: OrderedDict[str, tuple[CachedUrl, float]] = (
+            OrderedDict())
+        self._expirations: list[tuple[datetime, str]] = []
+        # expirations of the entries which are in the cache now
+        self._tracked: set[tuple[datetime, str]] = set()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, short_url: str) -> CachedUrl | None:
+        entry = self._entries.get(short_url)
+        if entry is None:
+            return None
+
+        url, stored = entry
+        if (time.monotonic() - stored > self._ttl
+                or url.is_expired(datetime.utcnow())):
+            self.pop(short_url)
+            return None
+
+        self._entries.move_to_end(short_url)
+        return url
+
+    def set(self, short_url: str, url: CachedUrl) -> None:
+        self.pop(short_url)
+        self._entries[short_url] = (url, time.monotonic())
+        self._track_expiration(short_url, url)
+        if len(self._entries) > self._size:
+            self.pop(next(iter(self._entries)))
+
+    def add_cold(self, short_url: str, url: CachedUrl) -> bool:
+        """
+        Add the entry as the least recently used one.
+        It is used on warm-up, where the hottest URLs come first.
+        """
+
+        if short_url in self._entries or len(self._entries) >= self._size:
+            return False
+
+        self._entries[short_url] = (url, time.monotonic())
+        self._entries.move_to_end(short_url, last=False)
+        self._track_expiration(short_url, url)
+        return True
+
+    def pop(self, short_url: str) -> None:
+        entry = self._entries.pop(short_url, None)
+        if entry is None or entry[0].expires_at is None:
+            return
+
+        self._tracked.discard((entry[0].expires_at, short_url))
+        # the heap item is left behind, the heap is rebuilt
+        # when there are too many of them
+        if len(self._expirations) > 2 * len(self._tracked) + HEAP_SLACK:
+            self._expirations = list(self._tracked)
+            heapq.heapify(self._expirations)
+
+    def _track_expiration(self, short_url: str, url: CachedUrl) -> None:
+        if url.expires_at is None:
+            return
+
+        item = (url.expires_at, short_url)
+        self._tracked.add(item)
+        heapq.heappush(self._expirations, item)
+
+    def evict_expired(self, now: datetime) -> int:
+        """Remove entries which expired by now."""
+
+        evicted = 0
+        while self._expirations and self._expirations[0][0] <= now:
+            item = heapq.heappop(self._expirations)
+            # the entry may be replaced or evicted already
+            if item in self._tracked:
+                self.pop(item[1])
+                evicted += 1
+        return evicted
+
+    async def warm_up(self, db: AsyncSession, limit: int) -> int:
+        """Load the most clicked active URLs from the database."""
+
+        statement = select(
+            UrlModel.id, UrlModel.short_url,
+            UrlModel.full_url, UrlModel.expires_at
+        ).where(UrlModel.is_active == True).where(or_(  # noqa
+            UrlModel.expires_at.is_(None),
+            UrlModel.expires_at > datetime.utcnow()
+        )).order_by(UrlModel.clicks.desc()).limit(limit)
+        results = await db.execute(statement=statement)
+
+        return sum(
+            self.add_cold(row.short_url, CachedUrl(
+                row.id, row.full_url, row.expires_at))
+            for row in results.all()
+        )
+
+    def load_snapshot(self, path: str, deadline: float) -> int:
+        """Load entries from the snapshot until the deadline is reached."""
+
+        loaded = 0
+        now = datetime.utcnow()
+
+        with open(path, 'rb') as file, mmap.mmap(
+                file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+                raise ValueError('Unknown snapshot format')
+
+            position = len(SNAPSHOT_MAGIC)
+            while position < len(data) and time.perf_counter() < deadline:
+                id, expires, short_size, full_size = (
+                    SNAPSHOT_RECORD.unpack_from(data, position))
+                position += SNAPSHOT_RECORD.size
+                short_url = data[position:position + short_size].decode()
+                position += short_size
+                full_url = data[position:position + full_size].decode()
+                position += full_size
+
+                url = CachedUrl(
+                    id, full_url,
+                    datetime.fromtimestamp(expires, timezone.utc).replace(
+                        tzinfo=None) if expires else None
+                )
+                if not url.is_expired(now):
+                    loaded += self.add_cold(short_url, url)
+
+        return loaded
+
+    def save_snapshot(self, path: str) -> int:
+        """Write entries to the snapshot, the most recently used first."""
+
+        entries = list(reversed(self._entries.items()))
+        # every worker writes its own file, the last replace wins
+        temp_path = f'{path}.{os.getpid()}.tmp'
+
+        with open(temp_path, 'wb') as file:
+            file.write(SNAPSHOT_MAGIC)
+            for short_url, (url, _) in entries:
+                short_bytes = short_url.encode()
+                full_bytes = url.full_url.encode()
+                expires = (
+                    url.expires_at.replace(tzinfo=timezone.utc).timestamp()
+                    if url.expires_at else 0
+                )
+                file.write(SNAPSHOT_RECORD.pack(
+                    url.id, expires, len(short_bytes), len(full_bytes)))
+                file.write(short_bytes)
+                file.write(full_bytes)
+
+        os.replace(temp_path, path)
+
+        return len(entries)
+
+    async def run_snapshots(self, path: str, interval: float) -> None:
+        """Write the snapshot periodically."""
+
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.save_snapshot(path=path)
+            except OSError:
+                logger.exception('Redirect cache snapshot was not saved')
+
+
+def _is_snapshot_fresh(path: str) -> bool:
+    try:
+        age = time.time() - os.path.getmtime(path)
+    except OSError:
+        return False
+    return age <= app_settings.cache_snapshot_max_age
+
+
+async def warm_up_cache(cache: RedirectCache) -> None:
+    """
+    Fill the cache before the first request.
+    A fresh snapshot is preferred, otherwise the database is queried.
+    """
+
+    started = time.perf_counter()
+    deadline = started + app_settings.cache_warmup_timeout
+    path = app_settings.cache_snapshot_path
+    loaded = 0
+    source = 'snapshot'
+
+    if path and _is_snapshot_fresh(path):
+        try:
+            loaded = cache.load_snapshot(path=path, deadline=deadline)
+        except (OSError, ValueError, struct.error):
+            logger.exception('Redirect cache snapshot can not be loaded')
+
+    if not loaded:
+        source = 'database'
+        try:
+            async with timeout(max(deadline - time.perf_counter(), 0)):
+                async with new_session() as db:
+                    loaded = await cache.warm_up(
+                        db=db, limit=app_settings.cache_warmup_size)
+        except asyncio.TimeoutError:
+            logger.warning('Redirect cache warm-up was interrupted')
+        except SQLAlchemyError:
+            logger.exception('Redirect cache warm-up failed')
+
+    logger.info(
+        'Redirect cache was warmed up with %(count)s URLs '
+        'from %(source)s in %(elapsed).3f s',
+        {
+            'count': loaded,
+            'source': source,
+            'elapsed': time.perf_counter() - started
+        }
+    )
+
+
+redirect_cache = RedirectCache(
+    size=app_settings.cache_size, ttl=app_settings.cache_ttl)
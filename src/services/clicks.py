@@ -0,0 +1,158 @@
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from api_logic.enrichment import get_device, get_geo
+from api_logic.logic import ClientInfo
+from core.config import app_settings
+from db.db import backend, new_session
+
+from .analytics import analytics
+from .breaker import DatabaseUnavailable, db_breaker
+from .entity import click_crud, url_crud
+from .spool import click_spool
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT_LENGTH = 512
+REFERRER_LENGTH = 1000
+
+
+class ClickBuffer:
+    """
+    Collects clicks and writes them in one transaction.
+    It is used by backends with a single writer, like SQLite,
+    where a commit per click limits the throughput.
+    """
+
+    def __init__(self, size: int):
+        self._size = size
+        self._clicks: list[dict[str, Any]] = []
+        self._increments: Counter[int] = Counter()
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self._clicks)
+
+    async def add(self, click: dict[str, Any], increment: bool) -> None:
+        self._clicks.append(click)
+        if increment:
+            self._increments[click['url_id']] += 1
+
+        if len(self._clicks) >= self._size:
+            await self.flush()
+
+    async def flush(self) -> None:
+        async with self._lock:
+            if not self._clicks:
+                return
+
+            clicks, self._clicks = self._clicks, []
+            increments, self._increments = self._increments, Counter()
+
+            try:
+                await db_breaker.call(
+                    'clicks', lambda: self._write(clicks, increments),
+                    size=len(clicks))
+            except DatabaseUnavailable:
+                # they are written later, when the database is back
+                click_spool.append(clicks=clicks, increments=increments)
+                return
+            except SQLAlchemyError:
+                # a single bad click, like a click of a purged URL, fails
+                # the whole batch, the spool writes them one by one
+                # and drops the ones which can not be written
+                logger.exception(
+                    '%(count)s clicks were not written, they are spooled',
+                    {'count': len(clicks)}
+                )
+                click_spool.append(clicks=clicks, increments=increments)
+                return
+
+        logger.debug(
+            '%(count)s Click objects were created',
+            {'count': len(clicks)}
+        )
+
+    async def _write(
+        self, clicks: list[dict[str, Any]], increments: Counter[int]
+    ) -> None:
+        async with new_session() as db:
+            await url_crud.add_clicks(db=db, counts=increments)
+            await click_crud.create_multi(db=db, clicks=clicks)
+            await db.commit()
+
+    async def run(self, interval: float) -> None:
+        """Write collected clicks periodically."""
+
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except (OSError, SQLAlchemyError):
+                logger.exception('Clicks were not written')
+
+
+click_buffer = ClickBuffer(size=app_settings.click_batch_size)
+
+
+async def record_click(
+    url_id: int, client: ClientInfo, increment: bool = False
+) -> None:
+    """
+    Enrich the click and save it to the database.
+    Runs as a background task, after the client was redirected.
+    Clicks counter of the URL is updated too if `increment` is set,
+    it is needed when the redirect was served from cache.
+    """
+
+    analytics.add(url_id=url_id, client_ip=client.ip)
+
+    click = {
+        'url_id': url_id,
+        'date': datetime.now(),
+        'client_ip': client.ip,
+        'user_agent': (client.user_agent or '')[:USER_AGENT_LENGTH] or None,
+        'referrer': (client.referrer or '')[:REFERRER_LENGTH] or None,
+        'device': get_device(client.user_agent),
+        'geo': get_geo(client.ip),
+    }
+
+    if backend.batch_writes:
+        await click_buffer.add(click=click, increment=increment)
+        return
+
+    try:
+        await db_breaker.call('clicks', lambda: _write_click(click, increment))
+    except DatabaseUnavailable:
+        click_spool.append(
+            clicks=[click], increments=Counter({url_id: int(increment)}))
+        logger.warning(
+            'Click for URL with ID="%(url_id)s" was spooled',
+            {'url_id': url_id}
+        )
+        return
+    except SQLAlchemyError:
+        # the URL may be purged since the redirect
+        logger.exception(
+            'Click for URL with ID="%(url_id)s" was dropped',
+            {'url_id': url_id}
+        )
+        return
+
+    logger.debug(
+        'Click object for URL with ID="%(url_id)s" was created',
+        {'url_id': url_id}
+    )
+
+
+async def _write_click(click: dict[str, Any], increment: bool) -> None:
+    async with new_session() as db:
+        if increment:
+            await url_crud.update(field='clicks', db=db, id=click['url_id'])
+
+        await click_crud.create(db=db, **click)
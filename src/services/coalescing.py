@@ -0,0 +1,92 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, NamedTuple
+
+from core.config import app_settings
+
+
+class LeaderCancelled(Exception):
+    """The call which others were waiting for was cancelled."""
+
+
+class SingleFlight:
+    """
+    Runs one call per key at a time within the worker.
+    Callers which come while it is running get the same result.
+    If that call is cancelled, one of them makes the call again.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Future] = {}
+
+    async def do(
+        self, key: Hashable, func: Callable[[], Awaitable[Any]]
+    ) -> tuple[Any, bool]:
+        """Get the result and whether it was shared by another caller."""
+
+        while key in self._calls:
+            try:
+                return await asyncio.shield(self._calls[key]), True
+            except LeaderCancelled:
+                continue
+
+        future = asyncio.get_running_loop().create_future()
+        self._calls[key] = future
+
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.set_exception(LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as error:
+            future.set_exception(error)
+            # nobody may wait for it, do not log it as never retrieved
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._calls[key]
+
+
+class SavedResponse(NamedTuple):
+    full_url: str
+    status_code: int
+    body: Any
+
+
+class IdempotencyStore:
+    """Responses by Idempotency-Key, kept `ttl` seconds within the worker."""
+
+    def __init__(self, size: int, ttl: float):
+        self._size = size
+        self._ttl = ttl
+        # key: (saved response, time it was stored)
+        self._responses: OrderedDict[str, tuple[SavedResponse, float]] = (
+            OrderedDict())
+
+    def get(self, key: str) -> SavedResponse | None:
+        entry = self._responses.get(key)
+        if entry is None:
+            return None
+
+        saved, stored = entry
+        if time.monotonic() - stored > self._ttl:
+            del self._responses[key]
+            return None
+
+        return saved
+
+    def set(self, key: str, saved: SavedResponse) -> None:
+        self._responses[key] = (saved, time.monotonic())
+        self._responses.move_to_end(key)
+        if len(self._responses) > self._size:
+            self._responses.popitem(last=False)
+
+
+create_flight = SingleFlight()
+idempotency_store = IdempotencyStore(
+    size=app_settings.idempotency_size, ttl=app_settings.idempotency_ttl)
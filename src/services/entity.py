@@ -1,11 +1,11 @@
 from models.entity import Click as ClickModel
 from models.entity import Url as UrlModel
-from schemas.entity import ClickInfo, Url, UrlBase
+from schemas.entity import ClickInfo, Url, UrlCreate
 
 from .base import ClickCRUD, UrlCRUD
 
 
-class RepositoryUrl(UrlCRUD[UrlModel, UrlBase, Url]):
+class RepositoryUrl(UrlCRUD[UrlModel, UrlCreate, Url]):
     pass
 
 
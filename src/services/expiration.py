@@ -0,0 +1,63 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from core.config import app_settings
+from db.db import new_session
+
+from .cache import RedirectCache
+from .entity import url_crud
+
+logger = logging.getLogger(__name__)
+
+
+async def sweep_expired(cache: RedirectCache) -> None:
+    """
+    Deactivate expired URLs and purge the ones which expired long ago.
+    Work is done in small batches found by the `expires_at` index.
+    """
+
+    now = datetime.utcnow()
+    cache.evict_expired(now=now)
+
+    async with new_session() as db:
+        for _ in range(app_settings.expiry_max_batches):
+            short_urls = await url_crud.deactivate_expired(
+                db=db, now=now, limit=app_settings.expiry_batch_size)
+            for short_url in short_urls:
+                cache.pop(short_url)
+            if short_urls:
+                logger.debug(
+                    '%(count)s expired URLs were deactivated',
+                    {'count': len(short_urls)}
+                )
+            if len(short_urls) < app_settings.expiry_batch_size:
+                break
+
+        if not app_settings.expiry_purge_after:
+            return
+
+        before = now - timedelta(seconds=app_settings.expiry_purge_after)
+        for _ in range(app_settings.expiry_max_batches):
+            purged = await url_crud.purge_expired(
+                db=db, before=before, limit=app_settings.expiry_batch_size)
+            if purged:
+                logger.debug(
+                    '%(count)s expired URLs were purged',
+                    {'count': purged}
+                )
+            if purged < app_settings.expiry_batch_size:
+                break
+
+
+async def run_sweeper(cache: RedirectCache, interval: float) -> None:
+    """Sweep expired URLs periodically."""
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await sweep_expired(cache=cache)
+        except SQLAlchemyError:
+            logger.exception('Expired URLs sweep failed')
@@ -0,0 +1,164 @@
+import asyncio
+import glob
+import json
+import logging
+import os
+from collections import Counter
+from datetime import datetime
+from typing import Any
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from core.config import app_settings
+from db.db import new_session
+
+from .breaker import DatabaseUnavailable, db_breaker
+from .entity import click_crud, url_crud
+
+logger = logging.getLogger(__name__)
+
+REPLAY_SUFFIX = '.replay-'
+# errors of a click itself, it is dropped instead of being retried forever
+INVALID_CLICKS = (SQLAlchemyError, ValueError, KeyError)
+
+
+class ClickSpool:
+    """
+    Append-only file of clicks which were not written to the database.
+    Every worker appends to its own file and replays it,
+    files of stopped workers are replayed by any worker.
+    """
+
+    def __init__(self, path: str, batch_size: int):
+        self._path = path
+        self._batch_size = batch_size
+        self.spooled = 0
+        self.replayed = 0
+        self.dropped = 0
+
+    @property
+    def worker_path(self) -> str:
+        return f'{self._path}.{os.getpid()}'
+
+    def append(
+        self, clicks: list[dict[str, Any]], increments: Counter
+    ) -> None:
+        """Save clicks, `increments` are clicks counters of URLs."""
+
+        with open(self.worker_path, 'a', encoding='utf-8') as file:
+            for click in clicks:
+                file.write(json.dumps({
+                    **click,
+                    'date': click['date'].isoformat(),
+                    'increment': increments[click['url_id']] > 0,
+                }) + '\n')
+                if increments[click['url_id']] > 0:
+                    increments[click['url_id']] -= 1
+
+        self.spooled += len(clicks)
+
+    async def replay(self) -> None:
+        """Write spooled clicks to the database while it is available."""
+
+        if not db_breaker.allow():
+            return
+
+        for path in glob.glob(f'{glob.escape(self._path)}.*'):
+            spool_path, _, replayer = path.partition(REPLAY_SUFFIX)
+            # a running worker may append to its file or replay it
+            owner = replayer or spool_path.rpartition('.')[2]
+            if not owner.isdigit() or (
+                    owner != str(os.getpid()) and _is_alive(int(owner))):
+                continue
+
+            replay_path = f'{spool_path}{REPLAY_SUFFIX}{os.getpid()}'
+            if path != replay_path:
+                try:
+                    # the file is taken by one worker only
+                    os.rename(path, replay_path)
+                except FileNotFoundError:
+                    continue
+
+            await self._replay_file(replay_path)
+
+    async def _replay_file(self, path: str) -> None:
+        with open(path, encoding='utf-8') as file:
+            lines = file.readlines()
+
+        position = 0
+        # lines before it are written one by one
+        single_until = 0
+
+        try:
+            while position < len(lines):
+                size = 1 if position < single_until else self._batch_size
+                batch = lines[position:position + size]
+                try:
+                    await db_breaker.call(
+                        'replay', lambda: self._write(batch), size=len(batch))
+                except DatabaseUnavailable:
+                    break
+                except INVALID_CLICKS:
+                    if size > 1:
+                        # a single bad click, like a click of a purged URL,
+                        # fails the whole batch
+                        single_until = position + len(batch)
+                        continue
+                    logger.exception(
+                        'Spooled click was dropped: %(line)s',
+                        {'line': batch[0].strip()}
+                    )
+                    self.dropped += 1
+                else:
+                    self.replayed += len(batch)
+                position += len(batch)
+        finally:
+            if position < len(lines):
+                # the rest is returned to the spool
+                with open(self.worker_path, 'a', encoding='utf-8') as file:
+                    file.writelines(lines[position:])
+            os.remove(path)
+
+        logger.info(
+            'Spooled clicks from "%(path)s" were replayed',
+            {'path': path}
+        )
+
+    async def _write(self, lines: list[str]) -> None:
+        clicks = [json.loads(line) for line in lines]
+        increments = Counter(
+            click['url_id'] for click in clicks if click.pop('increment'))
+        for click in clicks:
+            click['date'] = datetime.fromisoformat(click['date'])
+
+        async with new_session() as db:
+            await url_crud.add_clicks(db=db, counts=increments)
+            await click_crud.create_multi(db=db, clicks=clicks)
+            await db.commit()
+
+    async def run(self, interval: float) -> None:
+        """Replay spooled clicks periodically."""
+
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.replay()
+            except (OSError, ValueError, SQLAlchemyError):
+                logger.exception('Spooled clicks were not replayed')
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # it is run by another user
+        return True
+    return True
+
+
+click_spool = ClickSpool(
+    path=app_settings.click_spool_path,
+    batch_size=app_settings.click_batch_size
+)
@@ -0,0 +1,36 @@
+import os
+import tempfile
+
+# settings are read on import, so the test database is set up first,
+# the embedded one unless another is given, its tables are dropped
+TEST_DIR = tempfile.mkdtemp()
+os.environ.setdefault(
+    'DATABASE_DSN', f'sqlite+aiosqlite:///{TEST_DIR}/test.db')
+os.environ['CLICK_SPOOL_PATH'] = f'{TEST_DIR}/clicks.spool'
+os.environ['LOG_LEVEL'] = 'WARNING'
+
+import pytest  # noqa: E402
+
+import models.entity  # noqa: E402, F401
+from db import db as database  # noqa: E402
+from db.db import Base  # noqa: E402
+
+
+@pytest.fixture
+async def engine():
+    """Fresh schema in the embedded database for every test."""
+
+    database.init_engine()
+    async with database.engine.begin() as connection:
+        await connection.run_sync(Base.metadata.drop_all)
+        await connection.run_sync(Base.metadata.create_all)
+
+    yield database.engine
+
+    await database.dispose_engine()
+
+
+@pytest.fixture
+async def db(engine):
+    async with database.new_session() as session:
+        yield session
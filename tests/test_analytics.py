@@ -0,0 +1,61 @@
+from schemas.entity import UrlBase
+from services.analytics import HyperLogLog, StreamAnalytics
+from services.entity import url_crud
+
+
+def test_small_sketch_is_sparse():
+    sketch = HyperLogLog()
+    for number in range(10):
+        sketch.add(f'10.0.0.{number}')
+
+    data = sketch.to_bytes()
+    assert len(data) == 10 * HyperLogLog.sparse_item.size
+    assert HyperLogLog(data).count() == 10
+
+
+def test_large_sketch_becomes_dense():
+    sparse, dense = HyperLogLog(), HyperLogLog(bytes(HyperLogLog.size))
+    for number in range(1000):
+        sparse.add(f'10.0.{number // 256}.{number % 256}')
+        dense.add(f'10.0.{number // 256}.{number % 256}')
+
+    assert len(sparse.to_bytes()) == HyperLogLog.size
+    assert sparse.to_bytes() == dense.to_bytes()
+    assert abs(sparse.count() - 1000) < 50
+
+
+def test_merge_sparse_into_dense():
+    sparse, dense = HyperLogLog(), HyperLogLog()
+    sparse.add('10.0.0.1')
+    for number in range(100):
+        dense.add(f'10.0.1.{number}')
+
+    dense.merge(sparse)
+    sparse.merge(dense)
+
+    assert dense.to_bytes() == sparse.to_bytes()
+
+
+def test_sketches_are_capped():
+    analytics = StreamAnalytics(top_size=10, max_sketches=2)
+    for url_id in range(3):
+        analytics.add(url_id=url_id, client_ip='10.0.0.1')
+    analytics.add(url_id=0, client_ip='10.0.0.2')
+
+    assert len(analytics) == 2
+    assert analytics.dropped == 1
+
+
+async def test_checkpoint_skips_purged_urls(db):
+    url_obj, _ = await url_crud.upsert(
+        db=db, obj_in=UrlBase(full_url='https://example.com/'))
+    analytics = StreamAnalytics(top_size=10, max_sketches=10)
+    analytics.add(url_id=url_obj.id, client_ip='10.0.0.1')
+    analytics.add(url_id=url_obj.id + 1, client_ip='10.0.0.1')
+
+    await analytics.checkpoint(db=db)
+
+    assert len(analytics) == 0
+    assert await analytics.unique_clients(url_id=url_obj.id, db=db) == 1
+    assert await analytics.unique_clients(
+        url_id=url_obj.id + 1, db=db) == 0
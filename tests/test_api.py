@@ -0,0 +1,152 @@
+from datetime import datetime, timedelta
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import update
+from sqlalchemy.sql import select
+
+from main import create_app
+from models.entity import Url
+
+
+@pytest.fixture
+async def client(engine):
+    transport = ASGITransport(app=create_app())
+    async with AsyncClient(
+            transport=transport, base_url='http://test') as client:
+        yield client
+
+
+async def test_create_and_redirect(client):
+    response = await client.post(
+        '/api/v1/urls/', json={'full_url': 'https://example.com/'})
+    assert response.status_code == 201
+    url = response.json()
+
+    response = await client.post(
+        '/api/v1/urls/', json={'full_url': 'https://example.com/'})
+    assert response.status_code == 302
+    assert response.json()['short_url'] == url['short_url']
+
+    for _ in range(2):
+        # the first one goes to the database, the second one to the cache
+        response = await client.get(f'/api/v1/{url["short_url"]}')
+        assert response.status_code == 307
+        assert response.headers['location'] == 'https://example.com/'
+
+    response = await client.get(f'/api/v1/urls/{url["id"]}/status')
+    assert response.status_code == 200
+    assert response.json()['unique_clients'] == 1
+
+
+async def test_delete(client):
+    response = await client.post(
+        '/api/v1/urls/', json={'full_url': 'https://example.com/'})
+    url = response.json()
+
+    response = await client.delete(f'/api/v1/urls/{url["id"]}')
+    assert response.status_code == 204
+
+    response = await client.get(f'/api/v1/urls/{url["id"]}')
+    assert response.status_code == 404
+
+
+async def test_batch(client):
+    response = await client.post('/api/v1/urls/batch', json=[
+        {'full_url': 'https://example.com/a'},
+        {'full_url': 'https://example.com/b'},
+        {'full_url': 'https://example.com/a'},
+    ])
+    assert response.status_code == 201
+    result = response.json()
+    assert [url['full_url'] for url in result] == [
+        'https://example.com/a',
+        'https://example.com/b',
+        'https://example.com/a',
+    ]
+
+
+async def test_batch_partial_success(client, monkeypatch):
+    monkeypatch.setattr('services.base.shortener', lambda: 'taken')
+    await client.post(
+        '/api/v1/urls/', json={'full_url': 'https://example.com/a'})
+
+    response = await client.post('/api/v1/urls/batch', json=[
+        {'full_url': 'https://example.com/a'},
+        {'full_url': 'https://example.com/b'},
+    ])
+    assert response.status_code == 201
+    first, second = response.json()
+    assert first['short_url'] == 'taken'
+    assert second == {
+        'full_url': 'https://example.com/b',
+        'error': 'Could not generate unique short URL',
+    }
+
+
+async def test_past_expiration_is_rejected(client):
+    response = await client.post('/api/v1/urls/batch', json=[
+        {'full_url': 'https://example.com/', 'expires_at': '2000-01-01T00:00'},
+    ])
+    assert response.status_code == 422
+
+
+async def test_deleted_url_gets_new_short_url(client):
+    response = await client.post(
+        '/api/v1/urls/', json={'full_url': 'https://example.com/'})
+    old = response.json()
+    await client.delete(f'/api/v1/urls/{old["id"]}')
+
+    response = await client.post('/api/v1/urls/', json={
+        'full_url': 'https://example.com/',
+        'expires_at': '2999-01-01T00:00',
+    })
+    assert response.status_code == 201
+    new = response.json()
+    assert new['id'] == old['id']
+    assert new['short_url'] != old['short_url']
+    assert new['is_active']
+    assert new['expires_at'] == '2999-01-01T00:00:00'
+
+    response = await client.get(f'/api/v1/{new["short_url"]}')
+    assert response.status_code == 307
+    response = await client.get(f'/api/v1/{old["short_url"]}')
+    assert response.status_code == 404
+
+
+async def test_create_probes_open_breaker(client, monkeypatch):
+    from services.breaker import db_breaker
+
+    monkeypatch.setattr(db_breaker, 'state', db_breaker.OPEN)
+    # the reset timeout is over
+    monkeypatch.setattr(db_breaker, '_opened', -1e9)
+
+    response = await client.post(
+        '/api/v1/urls/', json={'full_url': 'https://example.com/'})
+
+    assert response.status_code == 201
+    assert db_breaker.state == db_breaker.CLOSED
+
+
+async def test_expired_url_before_sweep(client, db):
+    response = await client.post('/api/v1/urls/', json={
+        'full_url': 'https://example.com/',
+        'expires_at': '2999-01-01T00:00',
+    })
+    url = response.json()
+    await db.execute(update(Url).where(Url.id == url['id']).values(
+        {'expires_at': datetime.utcnow() - timedelta(seconds=1)}))
+    await db.commit()
+
+    response = await client.get(f'/api/v1/urls/{url["id"]}/status')
+    assert response.status_code == 410
+
+    response = await client.get(f'/api/v1/urls/{url["id"]}')
+    assert response.status_code == 404
+    response = await client.get(f'/api/v1/{url["short_url"]}')
+    assert response.status_code == 404
+
+    db.expire_all()
+    url_obj = (await db.execute(
+        select(Url).where(Url.id == url['id']))).scalar_one()
+    assert url_obj.clicks == 0
@@ -0,0 +1,28 @@
+import asyncio
+
+import pytest
+
+from services.breaker import AdaptiveTimeout, CircuitBreaker
+
+
+def test_timeout_is_scaled_by_size():
+    call_timeout = AdaptiveTimeout(minimum=0.01, maximum=1)
+    call_timeout.observe(0.02)
+
+    # mean + 4 * deviation per item
+    assert call_timeout.value == pytest.approx(0.06)
+    assert call_timeout.scaled(size=100) == pytest.approx(6)
+
+
+async def test_large_batch_does_not_open_breaker():
+    breaker = CircuitBreaker(
+        failures=1, reset_timeout=10, timeout_min=0.001, timeout_max=0.05)
+
+    async def write(size):
+        await asyncio.sleep(0.001 * size)
+
+    for _ in range(5):
+        await breaker.call('batch', lambda: write(1), size=1)
+    await breaker.call('batch', lambda: write(30), size=30)
+
+    assert breaker.state == breaker.CLOSED
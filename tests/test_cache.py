@@ -0,0 +1,43 @@
+import time
+from datetime import datetime, timedelta
+
+from services.cache import HEAP_SLACK, CachedUrl, RedirectCache
+
+
+def test_snapshot_keeps_entries_and_order(tmp_path):
+    cache = RedirectCache(size=3, ttl=60)
+    for number in range(4):
+        cache.set(f's{number}', CachedUrl(number, f'https://e.com/{number}'))
+    cache.get('s1')
+
+    path = str(tmp_path / 'snapshot')
+    assert cache.save_snapshot(path=path) == 3
+    assert [file.name for file in tmp_path.iterdir()] == ['snapshot']
+
+    loaded = RedirectCache(size=3, ttl=60)
+    assert loaded.load_snapshot(
+        path=path, deadline=time.perf_counter() + 1) == 3
+    assert list(loaded._entries) == ['s2', 's3', 's1']
+    assert loaded.get('s1') == CachedUrl(1, 'https://e.com/1')
+
+
+def test_expiration_heap_does_not_outgrow_cache():
+    cache = RedirectCache(size=10, ttl=60)
+    expires_at = datetime.utcnow() + timedelta(days=365)
+    for number in range(10000):
+        cache.set(f's{number}', CachedUrl(number, 'https://e.com/', expires_at))
+        if number % 3 == 0:
+            cache.pop(f's{number - 1}')
+
+    assert len(cache) <= 10
+    assert len(cache._expirations) <= 2 * 10 + HEAP_SLACK
+
+
+def test_expired_entries_are_evicted():
+    cache = RedirectCache(size=10, ttl=60)
+    now = datetime.utcnow()
+    cache.set('old', CachedUrl(1, 'https://e.com/', now + timedelta(seconds=1)))
+    cache.set('new', CachedUrl(2, 'https://e.com/', now + timedelta(days=1)))
+
+    assert cache.evict_expired(now=now + timedelta(seconds=2)) == 1
+    assert list(cache._entries) == ['new']
@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from services.coalescing import SingleFlight
+
+
+async def test_concurrent_calls_share_result():
+    flight = SingleFlight()
+    calls = 0
+
+    async def func():
+        nonlocal calls
+        calls += 1
+        number = calls
+        await asyncio.sleep(0.01)
+        return number
+
+    results = await asyncio.gather(
+        flight.do('a', func), flight.do('a', func), flight.do('b', func))
+
+    assert calls == 2
+    assert results[0] == (1, False)
+    assert results[1] == (1, True)
+    assert results[2] == (2, False)
+
+
+async def test_follower_retries_when_leader_is_cancelled():
+    flight = SingleFlight()
+    started = asyncio.Event()
+
+    async def slow():
+        started.set()
+        await asyncio.sleep(10)
+
+    async def fast():
+        return 'done'
+
+    leader = asyncio.create_task(flight.do('a', slow))
+    await started.wait()
+    follower = asyncio.create_task(flight.do('a', fast))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    with pytest.raises(asyncio.CancelledError):
+        await leader
+    assert await follower == ('done', False)
@@ -0,0 +1,154 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+from sqlalchemy.sql import select
+
+from models.entity import Click, Url
+from schemas.entity import UrlBase
+from services.entity import click_crud, url_crud
+
+
+async def test_create_multi_dedups_and_keeps_order(db):
+    existing, _ = await url_crud.upsert(
+        db=db, obj_in=UrlBase(full_url='https://example.com/a'))
+
+    result = await url_crud.create_multi(db=db, url_list=[
+        UrlBase(full_url='https://example.com/b'),
+        UrlBase(full_url='https://example.com/a'),
+        UrlBase(full_url='https://example.com/b'),
+    ])
+
+    assert [url.full_url for url in result] == [
+        'https://example.com/b',
+        'https://example.com/a',
+        'https://example.com/b',
+    ]
+    assert result[1].id == existing.id
+    assert result[0].id == result[2].id
+
+
+async def test_upsert_returns_existing(db):
+    url_in = UrlBase(full_url='https://example.com/')
+
+    created_obj, created = await url_crud.upsert(db=db, obj_in=url_in)
+    existing_obj, created_again = await url_crud.upsert(db=db, obj_in=url_in)
+
+    assert created and not created_again
+    assert existing_obj.id == created_obj.id
+    assert existing_obj.short_url == created_obj.short_url
+
+
+async def test_update_clicks_and_delete(db):
+    url_obj, _ = await url_crud.upsert(
+        db=db, obj_in=UrlBase(full_url='https://example.com/'))
+
+    clicked = await url_crud.update(
+        field='clicks', db=db, short_url=url_obj.short_url)
+    assert clicked.is_active
+    assert clicked.clicks == 1
+
+    clicked = await url_crud.update(field='clicks', db=db, id=url_obj.id)
+    assert clicked.clicks == 2
+
+    deleted = await url_crud.update(field='is_active', db=db, id=url_obj.id)
+    assert not deleted.is_active
+    assert await url_crud.update(
+        field='clicks', db=db, id=url_obj.id) is None
+
+
+async def test_clicks(db):
+    url_obj, _ = await url_crud.upsert(
+        db=db, obj_in=UrlBase(full_url='https://example.com/'))
+
+    await click_crud.create(
+        url_id=url_obj.id, db=db, client_ip='10.0.0.1', device='desktop')
+    await click_crud.create_multi(db=db, clicks=[
+        {'url_id': url_obj.id, 'date': datetime.now(), 'client_ip': '::1'},
+        {'url_id': url_obj.id, 'date': datetime.now(), 'client_ip': None},
+    ])
+    await url_crud.add_clicks(db=db, counts={url_obj.id: 2})
+    await db.commit()
+
+    clicks = await click_crud.get_multi(url_id=url_obj.id, db=db)
+    assert [str(click.client_ip) for click in clicks] == [
+        '10.0.0.1', '::1', 'None']
+    assert (await url_crud.get(db=db, value=url_obj.id)).clicks == 2
+
+
+async def test_expired_are_deactivated_and_purged(db):
+    now = datetime.utcnow()
+    expired, _ = await url_crud.upsert(db=db, obj_in=UrlBase(
+        full_url='https://example.com/old',
+        expires_at=now + timedelta(seconds=1)))
+    alive, _ = await url_crud.upsert(db=db, obj_in=UrlBase(
+        full_url='https://example.com/new',
+        expires_at=now + timedelta(days=1)))
+    await click_crud.create(url_id=expired.id, db=db, client_ip=None)
+
+    later = now + timedelta(seconds=2)
+    assert await url_crud.deactivate_expired(
+        db=db, now=later, limit=10) == [expired.short_url]
+    assert await url_crud.deactivate_expired(db=db, now=later, limit=10) == []
+
+    assert await url_crud.purge_expired(db=db, before=later, limit=10) == 1
+    assert await url_crud.get(db=db, value=expired.id) is None
+    assert await url_crud.get(db=db, value=alive.id) is not None
+    clicks = await db.execute(select(Click))
+    assert clicks.all() == []
+
+
+async def test_create_multi_partial_success(db, monkeypatch):
+    monkeypatch.setattr('services.base.shortener', lambda: 'taken')
+    existing, _ = await url_crud.upsert(
+        db=db, obj_in=UrlBase(full_url='https://example.com/a'))
+
+    result = await url_crud.create_multi(db=db, url_list=[
+        UrlBase(full_url='https://example.com/b'),
+        UrlBase(full_url='https://example.com/a'),
+    ])
+
+    assert result[0] is None
+    assert result[1].id == existing.id
+
+
+async def test_expired_url_is_revived_in_batch(db):
+    url_obj, _ = await url_crud.upsert(
+        db=db, obj_in=UrlBase(full_url='https://example.com/'))
+    await db.execute(update(Url).values(
+        expires_at=datetime.utcnow() - timedelta(days=1)))
+    await db.commit()
+
+    expires_at = datetime.utcnow() + timedelta(days=1)
+    [revived] = await url_crud.create_multi(db=db, url_list=[UrlBase(
+        full_url='https://example.com/', expires_at=expires_at)])
+
+    assert revived.id == url_obj.id
+    assert revived.short_url != url_obj.short_url
+    assert revived.expires_at == expires_at
+
+
+async def test_upsert_does_not_rewrite_existing(db):
+    url_in = UrlBase(full_url='https://example.com/')
+    url_obj, _ = await url_crud.upsert(db=db, obj_in=url_in)
+    await db.execute(update(Url).where(Url.id == url_obj.id).values(
+        {'clicks': 7}))
+    await db.commit()
+
+    existing_obj, created = await url_crud.upsert(db=db, obj_in=url_in)
+
+    assert not created
+    assert existing_obj.clicks == 7
+
+
+async def test_create_multi_in_chunks(db, monkeypatch):
+    monkeypatch.setattr('services.base.CHUNK_SIZE', 2)
+    existing, _ = await url_crud.upsert(
+        db=db, obj_in=UrlBase(full_url='https://example.com/2'))
+    full_urls = [f'https://example.com/{number}' for number in range(5)]
+
+    result = await url_crud.create_multi(db=db, url_list=[
+        UrlBase(full_url=full_url) for full_url in full_urls + full_urls])
+
+    assert [url.full_url for url in result] == full_urls + full_urls
+    assert result[2].id == existing.id
+    assert len({url.id for url in result}) == 5
@@ -0,0 +1,67 @@
+import glob
+import json
+import os
+import subprocess
+import sys
+from collections import Counter
+from datetime import datetime
+
+from sqlalchemy.sql import select
+
+from models.entity import Click
+from schemas.entity import UrlBase
+from services.entity import url_crud
+from services.spool import REPLAY_SUFFIX, ClickSpool
+
+
+def _click(url_id):
+    return {'url_id': url_id, 'date': datetime.now(), 'client_ip': '1.1.1.1'}
+
+
+async def test_replay_drops_clicks_of_purged_urls(db, tmp_path):
+    spool = ClickSpool(path=str(tmp_path / 'clicks'), batch_size=10)
+    url_obj, _ = await url_crud.upsert(
+        db=db, obj_in=UrlBase(full_url='https://example.com/'))
+    spool.append(
+        clicks=[_click(url_obj.id), _click(url_obj.id + 1),
+                _click(url_obj.id)],
+        increments=Counter({url_obj.id: 1})
+    )
+
+    await spool.replay()
+
+    clicks = (await db.execute(select(Click))).scalars().all()
+    assert len(clicks) == 2
+    assert (spool.replayed, spool.dropped) == (2, 1)
+    assert not glob.glob(str(tmp_path / 'clicks.*'))
+
+
+async def test_replay_takes_files_of_dead_workers(db, tmp_path):
+    spool = ClickSpool(path=str(tmp_path / 'clicks'), batch_size=10)
+    url_obj, _ = await url_crud.upsert(
+        db=db, obj_in=UrlBase(full_url='https://example.com/'))
+    process = subprocess.Popen([sys.executable, '-c', ''])
+    process.wait()
+    dead_pid = process.pid
+
+    with open(tmp_path / f'clicks.1{REPLAY_SUFFIX}{dead_pid}', 'w') as file:
+        file.write(json.dumps({
+            'url_id': url_obj.id,
+            'date': datetime.now().isoformat(),
+            'increment': False,
+        }) + '\n')
+
+    await spool.replay()
+
+    assert spool.replayed == 1
+    assert not glob.glob(str(tmp_path / 'clicks.*'))
+
+
+async def test_replay_skips_files_of_running_workers(db, tmp_path):
+    spool = ClickSpool(path=str(tmp_path / 'clicks'), batch_size=10)
+    path = tmp_path / f'clicks.{os.getppid()}'
+    path.write_text('')
+
+    await spool.replay()
+
+    assert glob.glob(str(tmp_path / 'clicks.*')) == [str(path)]
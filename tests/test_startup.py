@@ -0,0 +1,22 @@
+from core.profiling import STARTUP_BUDGET, measure_startup, parse_importtime
+
+
+def test_startup_is_within_budget():
+    elapsed, packages = measure_startup()
+
+    assert elapsed <= STARTUP_BUDGET, sorted(
+        packages.items(), key=lambda item: item[1], reverse=True)[:10]
+
+
+def test_nested_packages_are_reported():
+    output = (
+        'import time: self [us] | cumulative | imported package\n'
+        'import time:        10 |         10 |       sqlalchemy.sql\n'
+        'import time:        20 |         30 |     sqlalchemy\n'
+        'import time:        40 |         70 |   fastapi\n'
+        'import time:         5 |          5 |   fastapi.routing\n'
+        'import time:         1 |         76 | main\n'
+    )
+
+    assert parse_importtime(output) == {
+        'main': 76, 'fastapi': 75, 'sqlalchemy': 30}